@@ -2,3 +2,15 @@ from .tracing import init_tracing  # noqa
 from .tracing import trace_client  # noqa
 from .tracing import trace_pipeline  # noqa
 from .tracing import trace_pubsub  # noqa
+from .tracing import trace_connection_pool  # noqa
+from .pool import get_pool_stats  # noqa
+from .transaction import get_contention_stats  # noqa
+from .streams import inject_stream_context  # noqa
+from .streams import trace_stream_batch  # noqa
+from .flight_recorder import FlightRecorder  # noqa
+from .shared_metrics import SharedMetrics  # noqa
+from .key_templates import KeyNormalizer  # noqa
+from .replay import CommandRecorder  # noqa
+from .overhead import get_overhead_stats  # noqa
+from .command import RedisCommand  # noqa
+from .worker import SpanWorker  # noqa
@@ -0,0 +1,39 @@
+"""
+Replays a recording of the traced commands against a Redis server::
+
+    $ python -m redis_opentracing commands.bin --speed 2
+"""
+from __future__ import print_function
+
+import argparse
+
+from .replay import replay
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        prog='python -m redis_opentracing',
+        description='Replays a recording of Redis commands.'
+    )
+    parser.add_argument('path', help='the recording to replay')
+    parser.add_argument('--url', default='redis://localhost:6379/0',
+                        help='the Redis server to replay against')
+    parser.add_argument('--speed', type=float, default=1.0,
+                        help='the replay rate, e.g. 2 for twice as fast')
+    parser.add_argument('--max-speed', action='store_true',
+                        help='replay as fast as possible')
+    args = parser.parse_args(argv)
+
+    import redis
+
+    client = redis.StrictRedis.from_url(args.url)
+    stats = replay(args.path, client,
+                   None if args.max_speed else args.speed)
+
+    print('%(count)d commands (%(errors)d errors) in %(duration).3fs' % stats)
+    for name in ('mean', 'p50', 'p90', 'p99', 'max'):
+        print('%s: %.3fms' % (name, stats[name] * 1000.0))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,83 @@
+from .key_templates import _get_command_name, _get_keys
+
+
+class RedisCommand(object):
+    """
+    Describes a traced command (or pipeline) to the span callbacks.
+    The name, keys and stack are evaluated on first access only.
+
+    Once the Redis call returns, its duration (in seconds) and its
+    result (or the raised exception) are set as well.
+    """
+
+    def __init__(self, args, command_stack=None, transaction=None):
+        self.args = args
+        self.transaction = transaction
+        self.duration = None
+        self.result = None
+        self.exception = None
+        self._command_stack = command_stack
+        self._name = None
+        self._keys = None
+        self._stack = None
+
+    @property
+    def name(self):
+        """
+        The upper-cased command name, e.g. 'GET', or 'MULTI' for pipelines.
+        """
+        if self._name is None:
+            self._name = _get_command_name(self.args)
+
+        return self._name
+
+    @property
+    def is_pipeline(self):
+        return self._command_stack is not None
+
+    @property
+    def stack(self):
+        """
+        The commands of a pipeline, as RedisCommand objects,
+        or None for single commands.
+        """
+        if self._stack is None and self._command_stack is not None:
+            self._stack = [RedisCommand(command[0])
+                           for command in self._command_stack]
+
+        return self._stack
+
+    @property
+    def keys(self):
+        """
+        The keys of the command, or of all the commands of a pipeline.
+        """
+        if self._keys is None:
+            if self.is_pipeline:
+                # The set finds the duplicates, the list keeps the order.
+                keys = []
+                seen = set()
+                for command in self.stack:
+                    for key in command.keys:
+                        if key not in seen:
+                            seen.add(key)
+                            keys.append(key)
+                self._keys = keys
+            else:
+                self._keys = _get_keys(self.name, self.args)
+
+        return self._keys
+
+    @property
+    def result_size(self):
+        """
+        A summary of the result: its length for strings and
+        collections, 0 for None and 1 for any other value.
+        """
+        if self.result is None:
+            return 0
+
+        try:
+            return len(self.result)
+        except TypeError:
+            return 1
@@ -11,3 +11,56 @@ MULTI_COMMAND = 'MULTI'
 # The SUB command, used as operation name
 # for pubsub operations.
 SUB_COMMAND = 'SUB'
+
+# The operation name for optimistic transactions
+# executed through transaction().
+TRANSACTION_COMMAND = 'TRANSACTION'
+
+# Tags for the optimistic transactions attempts.
+TRANSACTION_ATTEMPTS_TAG = 'redis.transaction.attempts'
+TRANSACTION_RETRIES_TAG = 'redis.transaction.retries'
+
+# Tag marking a WatchError (a watched key changed),
+# which is reported as contention instead of an error.
+CONTENTION_TAG = 'redis.contention'
+
+# The operation names for the traced processing
+# of a batch of stream entries, and of each entry.
+STREAM_BATCH_COMMAND = 'XBATCH'
+STREAM_ENTRY_COMMAND = 'XENTRY'
+
+# The entry field holding the producer span context.
+STREAM_CONTEXT_FIELD = 'ot-span-context'
+
+# Tags for the traced stream batches and entries.
+STREAM_BATCH_SIZE_TAG = 'redis.stream.batch_size'
+STREAM_PENDING_TAG = 'redis.stream.pending'
+STREAM_MAX_ENTRY_AGE_TAG = 'redis.stream.max_entry_age_ms'
+STREAM_NAME_TAG = 'redis.stream.name'
+STREAM_ENTRY_ID_TAG = 'redis.stream.entry_id'
+STREAM_ENTRY_AGE_TAG = 'redis.stream.entry_age_ms'
+
+# Tags for the traced scan iterations.
+SCAN_PAGES_TAG = 'redis.scan.pages'
+SCAN_ITEMS_TAG = 'redis.scan.items'
+SCAN_MATCH_TAG = 'redis.scan.match'
+SCAN_SERVER_TIME_TAG = 'redis.scan.server_time_ms'
+
+# Event and tags for the detected streaks of consecutive
+# non-pipelined commands of the same type.
+N_PLUS_ONE_EVENT = 'redis.n_plus_one'
+N_PLUS_ONE_TAG = 'redis.n_plus_one'
+N_PLUS_ONE_COMMAND_TAG = 'redis.n_plus_one.command'
+N_PLUS_ONE_COUNT_TAG = 'redis.n_plus_one.count'
+N_PLUS_ONE_TOTAL_TIME_TAG = 'redis.n_plus_one.total_time_ms'
+
+# Tag for the template of the key of a command.
+KEY_TEMPLATE_TAG = 'redis.key_template'
+
+# Tag for the time (in milliseconds) spent waiting
+# for a connection from the pool.
+POOL_WAIT_TIME_TAG = 'redis.pool.wait_time_ms'
+
+# Tag for the time (in milliseconds) spent in tracing
+# work, apart from the Redis call itself.
+OVERHEAD_TAG = 'redis.tracing.overhead_ms'
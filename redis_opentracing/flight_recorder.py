@@ -0,0 +1,135 @@
+from array import array
+import itertools
+import signal
+import sys
+import threading
+
+# The status of the recorded commands.
+STATUS_OK = 0
+STATUS_ERROR = 1
+STATUS_CONTENTION = 2
+
+_STATUS_NAMES = ('ok', 'error', 'contention')
+
+# Command ids are stored as unsigned shorts.
+_MAX_COMMAND_ID = 0xFFFF
+
+# The name reported for the command id 0, given to the
+# commands recorded once the ids are exhausted.
+OTHER_COMMAND = '(other)'
+
+
+class FlightRecorder(object):
+    """
+    Keeps fixed-size records of the last Redis commands executed in
+    the process, in preallocated arrays used as a ring buffer, so it
+    can stay always on. Each record holds the timestamp, duration,
+    command id, key hash and status of a command.
+
+    Key hashes come from hash() and are thus only comparable
+    within the same process. Once the command ids are exhausted,
+    the new commands are recorded as '(other)'.
+
+    :param size: the number of records to keep.
+    """
+
+    def __init__(self, size=4096):
+        if size <= 0:
+            raise ValueError('size must be positive')
+
+        self.size = size
+        self._timestamps = array('d', [0.0]) * size
+        self._durations = array('d', [0.0]) * size
+        self._command_ids = array('H', [0]) * size
+        self._key_hashes = array('L', [0]) * size
+        self._statuses = array('B', [0]) * size
+
+        # next() on a count is atomic, so slots can
+        # be claimed without a lock.
+        self._counter = itertools.count()
+        self._written = 0
+
+        self._commands = {}
+        self._command_names = [OTHER_COMMAND]
+        self._commands_lock = threading.Lock()
+
+    def record(self, command, key, timestamp, duration, status):
+        index = next(self._counter)
+        slot = index % self.size
+
+        self._timestamps[slot] = timestamp
+        self._durations[slot] = duration
+        self._command_ids[slot] = self._command_id(command)
+        self._key_hashes[slot] = 0 if key is None else hash(key) & 0xFFFFFFFF
+        self._statuses[slot] = status
+        self._written = index + 1
+
+    def _command_id(self, command):
+        command_id = self._commands.get(command)
+        if command_id is not None:
+            return command_id
+
+        with self._commands_lock:
+            command_id = self._commands.get(command)
+            if command_id is None:
+                if len(self._command_names) > _MAX_COMMAND_ID:
+                    return 0
+
+                command_id = len(self._command_names)
+                self._command_names.append(command)
+                self._commands[command] = command_id
+
+        return command_id
+
+    def dump(self):
+        """
+        Returns the records, from the oldest to the newest, as dicts
+        with 'timestamp', 'duration', 'command', 'key_hash' and
+        'status' entries.
+        """
+        written = self._written
+        count = min(written, self.size)
+
+        records = []
+        for index in range(written - count, written):
+            slot = index % self.size
+            records.append({
+                'timestamp': self._timestamps[slot],
+                'duration': self._durations[slot],
+                'command': self._command_names[self._command_ids[slot]],
+                'key_hash': self._key_hashes[slot],
+                'status': _STATUS_NAMES[self._statuses[slot]],
+            })
+
+        return records
+
+    def write(self, stream=None):
+        """
+        Writes the records to a stream, one per line.
+
+        :param stream: the stream to write to, sys.stderr by default.
+        """
+        if stream is None:
+            stream = sys.stderr
+
+        for record in self.dump():
+            stream.write('%(timestamp).6f %(duration).6f %(command)s '
+                         '%(key_hash)08x %(status)s\n' % record)
+
+        stream.flush()
+
+    def install_signal_handler(self, signum=None, stream=None):
+        """
+        Writes the records to a stream whenever the process receives
+        a signal (SIGUSR1 by default).
+
+        :param signum: the signal number.
+        :param stream: the stream to write to, sys.stderr by default.
+        """
+        if signum is None:
+            signum = signal.SIGUSR1
+
+        def handler(signum, frame):
+            self.write(stream)
+
+        signal.signal(signum, handler)
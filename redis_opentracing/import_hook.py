@@ -0,0 +1,114 @@
+import sys
+import threading
+
+try:
+    from importlib.util import find_spec
+except ImportError:
+    # No PEP 451 import machinery (Python 2).
+    find_spec = None
+
+
+class _PatchingLoader(object):
+    def __init__(self, loader, callback):
+        self._loader = loader
+        self._callback = callback
+
+    def __getattr__(self, name):
+        return getattr(self._loader, name)
+
+    def create_module(self, spec):
+        create_module = getattr(self._loader, 'create_module', None)
+        if create_module is None:
+            return None
+
+        return create_module(spec)
+
+    def exec_module(self, module):
+        self._loader.exec_module(module)
+        self._callback(module)
+
+
+class _PatchingFinder(object):
+    """
+    Meta path finder calling back every time the watched modules
+    have been imported (and executed), including on reloads.
+    """
+
+    def __init__(self):
+        self._callbacks = {}
+        self._lock = threading.Lock()
+
+    def register(self, name, callback):
+        with self._lock:
+            self._callbacks[name] = callback
+
+    def find_spec(self, fullname, path=None, target=None):
+        with self._lock:
+            callback = self._callbacks.get(fullname)
+
+        if callback is None:
+            return None
+
+        # Let the rest of the finders locate the module, getting a new
+        # spec (unlike importlib.util.find_spec() on reloads).
+        spec = None
+        for finder in sys.meta_path:
+            finder_find_spec = getattr(finder, 'find_spec', None)
+            if finder is self or finder_find_spec is None:
+                continue
+
+            spec = finder_find_spec(fullname, path, target)
+            if spec is not None:
+                break
+
+        if spec is None or not hasattr(spec.loader, 'exec_module'):
+            return spec
+
+        spec.loader = _PatchingLoader(spec.loader, callback)
+        return spec
+
+
+_g_finder = None
+
+
+def when_imported(name, callback):
+    """
+    Calls callback with the module once it is imported, right away
+    if it already is, and again every time it is reloaded. Without
+    PEP 451 support, the module is imported right away instead, and
+    reloads are not covered.
+    """
+    global _g_finder
+
+    module = sys.modules.get(name)
+    if module is None and find_spec is None:
+        try:
+            __import__(name)
+        except ImportError:
+            return
+
+        module = sys.modules[name]
+
+    if module is not None:
+        callback(module)
+
+    if find_spec is None:
+        return
+
+    if _g_finder is None:
+        _g_finder = _PatchingFinder()
+        sys.meta_path.insert(0, _g_finder)
+
+    _g_finder.register(name, callback)
+
+
+def _remove_hooks():
+    global _g_finder
+
+    if _g_finder is not None:
+        try:
+            sys.meta_path.remove(_g_finder)
+        except ValueError:
+            pass
+
+        _g_finder = None
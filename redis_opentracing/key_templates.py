@@ -0,0 +1,132 @@
+from builtins import str
+from collections import OrderedDict
+import re
+import threading
+
+# The default rules, matched against every
+# segment of a key (in order).
+DEFAULT_RULES = (
+    (r'\d+', '{id}'),
+    (r'[0-9a-fA-F]{8}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-'
+     r'[0-9a-fA-F]{4}-[0-9a-fA-F]{12}', '{uuid}'),
+    (r'[0-9a-fA-F]{16,}', '{hash}'),
+)
+
+# The commands whose arguments are all keys.
+_ALL_KEYS_COMMANDS = frozenset([
+    'DEL', 'EXISTS', 'MGET', 'PFCOUNT', 'SDIFF', 'SINTER', 'SUNION',
+    'TOUCH', 'TRANSACTION', 'UNLINK', 'WATCH',
+])
+
+# The commands taking alternating keys and values.
+_KEY_VALUE_COMMANDS = frozenset(['MSET', 'MSETNX'])
+
+# The commands taking a number of keys, and the position of that number.
+_NUMKEYS_COMMANDS = {
+    'EVAL': 2,
+    'EVALSHA': 2,
+    'FCALL': 2,
+    'FCALL_RO': 2,
+}
+
+# The commands whose key follows a subcommand.
+_SUBCOMMAND_KEY_COMMANDS = frozenset(['MEMORY', 'OBJECT', 'XGROUP', 'XINFO'])
+
+# The commands without keys.
+_NO_KEYS_COMMANDS = frozenset([
+    'ACL', 'AUTH', 'BGSAVE', 'CLIENT', 'CLUSTER', 'COMMAND', 'CONFIG',
+    'DBSIZE', 'DISCARD', 'ECHO', 'EXEC', 'FLUSHALL', 'FLUSHDB',
+    'FUNCTION', 'INFO', 'KEYS', 'LASTSAVE', 'MULTI', 'PING',
+    'PSUBSCRIBE', 'PUBLISH', 'PUNSUBSCRIBE', 'QUIT', 'RANDOMKEY', 'SAVE',
+    'SCAN', 'SCAN_ITER', 'SCRIPT', 'SELECT', 'SLOWLOG', 'SUB',
+    'SUBSCRIBE', 'SWAPDB', 'TIME', 'UNSUBSCRIBE', 'UNWATCH', 'WAIT',
+])
+
+
+class KeyNormalizer(object):
+    """
+    Turns keys into templates of bounded cardinality, e.g.
+    'user:123456:profile' into 'user:{id}:profile'.
+
+    Keys are split into segments by the delimiters, and every segment
+    fully matching one of the rules is replaced by its placeholder.
+    The templates of the recently seen keys are kept in an LRU cache.
+
+    :param delimiters: the characters separating the segments.
+    :param rules: a sequence of (regex, placeholder) pairs.
+    :param cache_size: the number of templates to cache.
+    """
+
+    def __init__(self, delimiters=':/.', rules=DEFAULT_RULES,
+                 cache_size=1024):
+        self._split_re = re.compile('([%s])' % re.escape(delimiters))
+        self._rules = [(re.compile(r'(?:%s)\Z' % pattern), placeholder)
+                       for pattern, placeholder in rules]
+        self._cache_size = cache_size
+        self._cache = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __call__(self, key):
+        with self._lock:
+            template = self._cache.pop(key, None)
+            if template is not None:
+                # Re-insert to mark it as the most recently used.
+                self._cache[key] = template
+                return template
+
+        template = self._normalize(key)
+
+        with self._lock:
+            self._cache[key] = template
+            while len(self._cache) > self._cache_size:
+                self._cache.popitem(last=False)
+
+        return template
+
+    def _normalize(self, key):
+        if isinstance(key, bytes):
+            key = key.decode('utf-8', 'replace')
+
+        parts = self._split_re.split(str(key))
+
+        # Segments are at the even positions, delimiters at the odd ones.
+        for i in range(0, len(parts), 2):
+            for regex, placeholder in self._rules:
+                if regex.match(parts[i]):
+                    parts[i] = placeholder
+                    break
+
+        return ''.join(parts)
+
+
+def _get_command_name(args):
+    name = args[0] if args else ''
+    if isinstance(name, bytes):
+        name = name.decode('utf-8', 'replace')
+
+    return str(name).upper()
+
+
+def _get_keys(name, args):
+    name, _, subcommand = name.partition(' ')
+    if subcommand:
+        # Sent as part of the command name, e.g. 'CONFIG SET'.
+        args = (name, subcommand) + tuple(args[1:])
+
+    if name in _NO_KEYS_COMMANDS:
+        return []
+    if name in _ALL_KEYS_COMMANDS:
+        return list(args[1:])
+    if name in _KEY_VALUE_COMMANDS:
+        return list(args[1::2])
+    if name in _SUBCOMMAND_KEY_COMMANDS:
+        return list(args[2:3])
+    if name in _NUMKEYS_COMMANDS:
+        index = _NUMKEYS_COMMANDS[name]
+        try:
+            numkeys = int(args[index])
+        except (IndexError, ValueError):
+            return []
+        return list(args[index + 1:index + 1 + numkeys])
+
+    return list(args[1:2])
@@ -0,0 +1,83 @@
+import threading
+import time
+
+from .constants import (
+    N_PLUS_ONE_COMMAND_TAG,
+    N_PLUS_ONE_COUNT_TAG,
+    N_PLUS_ONE_EVENT,
+    N_PLUS_ONE_TAG,
+    N_PLUS_ONE_TOTAL_TIME_TAG,
+)
+
+
+class _Streak(object):
+    def __init__(self, parent, command, reported_max=0):
+        self.parent = parent
+        self.command = command
+        self.count = 0
+        self.total_time = 0.0
+        self.reported_max = reported_max
+
+
+class NPlusOneDetector(object):
+    """
+    Counts, per parent span, the consecutive non-pipelined commands
+    of the same type. Once a streak reaches the threshold, the parent
+    span is tagged with the command, count and total time of its
+    longest streak, and a log is added to it.
+    """
+
+    def __init__(self, threshold):
+        if threshold < 2:
+            raise ValueError('threshold must be at least 2')
+
+        self.threshold = threshold
+        self._local = threading.local()
+
+    def call(self, parent, command, method, *args, **kwargs):
+        if parent is None:
+            return method(*args, **kwargs)
+
+        start_time = time.time()
+        try:
+            return method(*args, **kwargs)
+        finally:
+            self._on_command(parent, command, time.time() - start_time)
+
+    def break_streak(self, parent):
+        """
+        Ends the current streak of the parent, e.g. when
+        a pipeline gets executed.
+        """
+        streak = getattr(self._local, 'streak', None)
+        if streak is not None and streak.parent is parent:
+            self._local.streak = _Streak(parent, None, streak.reported_max)
+
+    def _on_command(self, parent, command, duration):
+        streak = getattr(self._local, 'streak', None)
+        if streak is None or streak.parent is not parent:
+            streak = _Streak(parent, command)
+            self._local.streak = streak
+        elif streak.command != command:
+            streak = _Streak(parent, command, streak.reported_max)
+            self._local.streak = streak
+
+        streak.count += 1
+        streak.total_time += duration
+        if streak.count < self.threshold:
+            return
+
+        if streak.count == self.threshold:
+            parent.set_tag(N_PLUS_ONE_TAG, True)
+            parent.log_kv({
+                'event': N_PLUS_ONE_EVENT,
+                'command': command,
+                'threshold': self.threshold,
+            })
+
+        if streak.count > streak.reported_max:
+            streak.reported_max = streak.count
+            parent.set_tag(N_PLUS_ONE_COMMAND_TAG, command)
+            parent.set_tag(N_PLUS_ONE_COUNT_TAG, streak.count)
+            parent.set_tag(N_PLUS_ONE_TOTAL_TIME_TAG,
+                           streak.total_time * 1000.0)
@@ -0,0 +1,89 @@
+import threading
+import time
+
+# The most precise clock available.
+_clock = getattr(time, 'perf_counter', time.time)
+
+# The measured phases of the tracing work.
+PHASES = ('start', 'format', 'callback', 'finish')
+START, FORMAT, CALLBACK, FINISH = range(len(PHASES))
+
+
+class OverheadStats(object):
+    """
+    Aggregates the time spent by the wrappers in tracing work,
+    excluding the Redis calls themselves.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.count = 0
+            self.total = 0.0
+            self.max = 0.0
+            self.phases = [0.0] * len(PHASES)
+
+    def add(self, laps):
+        total = sum(laps)
+        with self._lock:
+            self.count += 1
+            self.total += total
+            if total > self.max:
+                self.max = total
+            for i, lap in enumerate(laps):
+                self.phases[i] += lap
+
+    def as_dict(self):
+        with self._lock:
+            stats = {
+                'count': self.count,
+                'total': self.total,
+                'max': self.max,
+                'mean': self.total / self.count if self.count else 0.0,
+            }
+            stats.update(zip(PHASES, self.phases))
+            return stats
+
+
+class _OverheadTimer(object):
+    __slots__ = ('_stats', '_last', 'laps')
+
+    def __init__(self, stats):
+        self._stats = stats
+        self._last = _clock()
+        self.laps = [0.0] * len(PHASES)
+
+    def lap(self, phase):
+        now = _clock()
+        self.laps[phase] += now - self._last
+        self._last = now
+
+    def skip(self):
+        # Leaves out the time since the last lap, e.g. the Redis call.
+        self._last = _clock()
+
+    @property
+    def total(self):
+        return sum(self.laps)
+
+    def done(self):
+        self.lap(FINISH)
+        self._stats.add(self.laps)
+
+
+_g_overhead_stats = OverheadStats()
+
+
+def get_overhead_stats():
+    """
+    Returns the time (in seconds) spent by the wrappers in tracing work,
+    measured when init_tracing() was called with measure_overhead=True,
+    as a dict with 'count', 'total', 'mean' and 'max' entries, plus the
+    total of every phase: 'start' (starting the span), 'format'
+    (formatting the statement and tags), 'callback' (start_span_cb)
+    and 'finish' (finishing the span).
+    """
+    return _g_overhead_stats.as_dict()
@@ -0,0 +1,95 @@
+import threading
+
+# Attribute used to attach the stats to the pool objects.
+_STATS_ATTR = '_ot_pool_stats'
+
+# Attribute marking the connections counted as in use.
+_CHECKOUT_ATTR = '_ot_pool_checkout'
+
+
+class PoolStats(object):
+    """
+    Cheap gauges describing the state of a Redis connection pool,
+    maintained by the traced checkout/release methods.
+    """
+
+    def __init__(self, max_connections=None):
+        self._lock = threading.Lock()
+        self.max = max_connections
+        self.created = 0
+        self.in_use = 0
+        self.waiters = 0
+        self.checkouts = 0
+        self.wait_time = 0.0
+        # Tells the checkouts apart from the ones before a reset.
+        self._generation = 0
+
+    @property
+    def idle(self):
+        return max(self.created - self.in_use, 0)
+
+    def on_wait_start(self):
+        with self._lock:
+            self.waiters += 1
+
+    def on_wait_end(self, wait_time, conn=None):
+        with self._lock:
+            self.waiters -= 1
+            if conn is not None:
+                self.in_use += 1
+                self.checkouts += 1
+                self.wait_time += wait_time
+                setattr(conn, _CHECKOUT_ATTR, self._generation)
+
+    def on_release(self, conn):
+        with self._lock:
+            # Only the connections counted at checkout, e.g. not the ones
+            # released by the pool itself when they fail to connect.
+            if getattr(conn, _CHECKOUT_ATTR, None) != self._generation:
+                return
+
+            setattr(conn, _CHECKOUT_ATTR, None)
+            self.in_use -= 1
+
+    def on_created(self):
+        with self._lock:
+            self.created += 1
+
+    def on_reset(self, max_connections=None):
+        with self._lock:
+            self.created = 0
+            self.in_use = 0
+            self._generation += 1
+            if max_connections is not None:
+                self.max = max_connections
+
+    def as_dict(self):
+        with self._lock:
+            return {
+                'in_use': self.in_use,
+                'idle': self.idle,
+                'waiters': self.waiters,
+                'max': self.max,
+                'checkouts': self.checkouts,
+                'wait_time': self.wait_time,
+            }
+
+
+def _get_stats(pool):
+    stats = getattr(pool, _STATS_ATTR, None)
+    if stats is None:
+        stats = PoolStats(getattr(pool, 'max_connections', None))
+        setattr(pool, _STATS_ATTR, stats)
+
+    return stats
+
+
+def get_pool_stats(pool):
+    """
+    Returns the gauges of a traced connection pool as a dict with
+    'in_use', 'idle', 'waiters', 'max', 'checkouts' and 'wait_time'
+    (the accumulated checkout wait, in seconds) entries.
+
+    :param pool: the Redis connection pool object.
+    """
+    return _get_stats(pool).as_dict()
@@ -0,0 +1,226 @@
+from builtins import str
+import struct
+import threading
+import time
+
+from .key_templates import _get_command_name
+
+_MAGIC = b'ROTR'
+_VERSION = 1
+
+# Header flags.
+_FLAG_SIZES_ONLY = 0x1
+
+# magic, version, flags.
+_HEADER = struct.Struct('<4sBB')
+
+# Record types.
+_COMMAND = b'C'
+_PIPELINE = b'P'
+
+# type, offset (in microseconds) since the start of the recording.
+_RECORD = struct.Struct('<cQ')
+# transaction flag, number of commands.
+_PIPELINE_HEADER = struct.Struct('<BI')
+_ARGS_COUNT = struct.Struct('<I')
+_ARG_SIZE = struct.Struct('<I')
+
+# The pubsub commands, which would switch the pooled
+# connections used by replay() to the subscribe mode.
+_PUBSUB_COMMANDS = frozenset([
+    'PSUBSCRIBE', 'PUNSUBSCRIBE', 'SSUBSCRIBE', 'SUBSCRIBE',
+    'SUNSUBSCRIBE', 'UNSUBSCRIBE',
+])
+
+
+class CommandRecorder(object):
+    """
+    Writes the traced commands, along with their offset since the
+    start of the recording and the boundaries of the pipelines, to
+    a compact binary file, to be replayed with replay().
+
+    Commands are written as they complete, so commands completing
+    concurrently may not be in strict order of their offsets. The
+    pubsub commands (e.g. SUBSCRIBE) are not recorded.
+
+    :param path: the file to write to.
+    :param sizes_only: If True, only the size of the arguments (past
+        the command name) is recorded, and replay() sends placeholder
+        values of the same size.
+    """
+
+    def __init__(self, path, sizes_only=False):
+        self.sizes_only = sizes_only
+        self._file = open(path, 'wb')
+        self._file.write(_HEADER.pack(_MAGIC, _VERSION,
+                                      _FLAG_SIZES_ONLY if sizes_only else 0))
+        self._start_time = time.time()
+        self._lock = threading.Lock()
+
+    def record_command(self, timestamp, args):
+        if _get_command_name(args) in _PUBSUB_COMMANDS:
+            return
+
+        data = _RECORD.pack(_COMMAND, self._offset(timestamp))
+        data += self._encode_args(args)
+        self._write(data)
+
+    def record_pipeline(self, timestamp, commands_args, transaction):
+        data = _RECORD.pack(_PIPELINE, self._offset(timestamp))
+        data += _PIPELINE_HEADER.pack(1 if transaction else 0,
+                                      len(commands_args))
+        data += b''.join(self._encode_args(args) for args in commands_args)
+        self._write(data)
+
+    def _offset(self, timestamp):
+        return max(int((timestamp - self._start_time) * 1000000), 0)
+
+    def _encode_args(self, args):
+        parts = [_ARGS_COUNT.pack(len(args))]
+        for i, arg in enumerate(args):
+            arg = _encode_arg(arg)
+            parts.append(_ARG_SIZE.pack(len(arg)))
+            if not self.sizes_only or i == 0:
+                # The command name is always kept.
+                parts.append(arg)
+
+        return b''.join(parts)
+
+    def _write(self, data):
+        with self._lock:
+            if not self._file.closed:
+                self._file.write(data)
+
+    def flush(self):
+        with self._lock:
+            self._file.flush()
+
+    def close(self):
+        with self._lock:
+            self._file.close()
+
+
+def _encode_arg(arg):
+    if isinstance(arg, bytes):
+        return arg
+    if isinstance(arg, float):
+        return repr(arg).encode('utf-8')
+
+    return str(arg).encode('utf-8')
+
+
+def read_records(path):
+    """
+    Yields the records of a file written by a CommandRecorder, as
+    (offset, commands, transaction) tuples, with the offset in seconds
+    and the commands as lists of arguments. Single commands are yielded
+    with a transaction value of None.
+    """
+    with open(path, 'rb') as f:
+        magic, version, flags = _HEADER.unpack(_read(f, _HEADER.size))
+        if magic != _MAGIC or version != _VERSION:
+            raise ValueError('%s is not a commands recording' % path)
+
+        sizes_only = bool(flags & _FLAG_SIZES_ONLY)
+        while True:
+            data = f.read(_RECORD.size)
+            if not data:
+                break
+
+            record_type, offset = _RECORD.unpack(data)
+            offset /= 1000000.0
+            if record_type == _COMMAND:
+                yield offset, [_read_args(f, sizes_only)], None
+            elif record_type == _PIPELINE:
+                transaction, count = _PIPELINE_HEADER.unpack(
+                    _read(f, _PIPELINE_HEADER.size)
+                )
+                commands = [_read_args(f, sizes_only) for _ in range(count)]
+                yield offset, commands, bool(transaction)
+            else:
+                raise ValueError('Invalid record type %r' % record_type)
+
+
+def _read(f, size):
+    data = f.read(size)
+    if len(data) != size:
+        raise ValueError('Truncated commands recording')
+
+    return data
+
+
+def _read_args(f, sizes_only):
+    count = _ARGS_COUNT.unpack(_read(f, _ARGS_COUNT.size))[0]
+    args = []
+    for i in range(count):
+        size = _ARG_SIZE.unpack(_read(f, _ARG_SIZE.size))[0]
+        if sizes_only and i > 0:
+            args.append(b'x' * size)
+        else:
+            args.append(_read(f, size))
+
+    return args
+
+
+def replay(path, client, speed=1.0):
+    """
+    Issues the commands of a recording against a Redis client, keeping
+    their relative timing (scaled by speed, or as fast as possible if
+    speed is None), and returns the latency stats as a dict with
+    'count', 'errors', 'duration', 'mean', 'p50', 'p90', 'p99' and
+    'max' entries (in seconds). The pubsub commands are skipped.
+
+    :param path: the file written by a CommandRecorder.
+    :param client: the Redis client to issue the commands through.
+    :param speed: the replay rate, e.g. 2.0 for twice as fast.
+    """
+    latencies = []
+    errors = 0
+    start_time = time.time()
+
+    for offset, commands, transaction in read_records(path):
+        if transaction is None and \
+                _get_command_name(commands[0]) in _PUBSUB_COMMANDS:
+            continue
+
+        if speed is not None:
+            delay = start_time + offset / speed - time.time()
+            if delay > 0:
+                time.sleep(delay)
+
+        command_start_time = time.time()
+        try:
+            if transaction is None:
+                client.execute_command(*commands[0])
+            else:
+                pipe = client.pipeline(transaction)
+                for args in commands:
+                    pipe.execute_command(*args)
+                pipe.execute(raise_on_error=False)
+        except Exception:
+            errors += 1
+
+        latencies.append(time.time() - command_start_time)
+
+    return _latency_stats(latencies, errors, time.time() - start_time)
+
+
+def _latency_stats(latencies, errors, duration):
+    latencies.sort()
+    count = len(latencies)
+
+    def percentile(p):
+        if not latencies:
+            return 0.0
+        return latencies[min(int(count * p), count - 1)]
+
+    return {
+        'count': count,
+        'errors': errors,
+        'duration': duration,
+        'mean': sum(latencies) / count if count else 0.0,
+        'p50': percentile(0.5),
+        'p90': percentile(0.9),
+        'p99': percentile(0.99),
+        'max': latencies[-1] if latencies else 0.0,
+    }
@@ -0,0 +1,277 @@
+import errno
+import mmap
+import os
+import struct
+import threading
+import weakref
+
+try:
+    import fcntl
+except ImportError:
+    # No advisory locks (Windows).
+    fcntl = None
+
+# Upper bounds (in seconds) of the default latency buckets,
+# plus an implicit overflow bucket.
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0)
+
+_MAGIC = b'ROTM'
+_VERSION = 1
+
+# magic, version, regions, commands per region, buckets.
+_HEADER = struct.Struct('<4sIIII')
+_BOUND = struct.Struct('<d')
+_PID = struct.Struct('<q')
+_NAME = struct.Struct('<32s')
+_COUNTER = struct.Struct('<Q')
+
+# Guards re-creating the per-object locks after a fork,
+# where os.register_at_fork() is not available.
+_g_fork_lock = threading.Lock()
+
+
+class SharedMetrics(object):
+    """
+    Per-command counters and latency buckets kept in a mmap-backed
+    file, so the workers of a pre-forked server aggregate them in a
+    single place, readable by an exporter through read().
+
+    Every process writes to a region of its own (claimed again after
+    a fork), taking over the region of a dead worker if needed, so
+    the counts of recycled workers are kept.
+
+    The layout of an existing file is read from its header, in which
+    case the rest of the arguments are ignored. It's best to create
+    the file before forking the workers.
+
+    :param path: the file holding the metrics.
+    :param regions: the maximum number of processes writing at once.
+    :param commands: the maximum number of commands per process.
+    :param buckets: the upper bounds (in seconds) of the latency
+        buckets.
+    """
+
+    def __init__(self, path, regions=64, commands=128,
+                 buckets=DEFAULT_BUCKETS):
+        self.path = path
+        self._lock = threading.Lock()
+        self._lock_pid = os.getpid()
+        if hasattr(os, 'register_at_fork'):
+            ref = weakref.ref(self)
+            os.register_at_fork(after_in_child=lambda: _reset_lock(ref))
+
+        fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            _lock(fd)
+            try:
+                if os.fstat(fd).st_size < _HEADER.size:
+                    self._init_file(fd, regions, commands, buckets)
+
+                self._mmap = mmap.mmap(fd, 0)
+            finally:
+                _unlock(fd)
+        finally:
+            os.close(fd)
+
+        magic, version, regions, commands, num_buckets = \
+            _HEADER.unpack_from(self._mmap, 0)
+        if magic != _MAGIC or version != _VERSION:
+            raise ValueError('%s is not a metrics file' % path)
+
+        self.regions = regions
+        self.commands = commands
+        self.buckets = tuple(
+            _BOUND.unpack_from(self._mmap, _HEADER.size + i * _BOUND.size)[0]
+            for i in range(num_buckets)
+        )
+
+        self._entry_size = _NAME.size + _COUNTER.size * (3 + num_buckets + 1)
+        self._region_size = _PID.size + self._entry_size * commands
+        self._regions_offset = _HEADER.size + _BOUND.size * num_buckets
+
+        self._pid = None
+        self._region = None
+        self._entries = {}
+        self._num_entries = 0
+
+    def _init_file(self, fd, regions, commands, buckets):
+        buckets = tuple(sorted(buckets))
+        entry_size = _NAME.size + _COUNTER.size * (3 + len(buckets) + 1)
+        size = (_HEADER.size + _BOUND.size * len(buckets) +
+                (_PID.size + entry_size * commands) * regions)
+
+        header = _HEADER.pack(_MAGIC, _VERSION, regions, commands,
+                              len(buckets))
+        header += b''.join(_BOUND.pack(bound) for bound in buckets)
+
+        os.ftruncate(fd, size)
+        os.lseek(fd, 0, os.SEEK_SET)
+        os.write(fd, header)
+
+    def record(self, command, duration, error=False):
+        pid = os.getpid()
+        if pid != self._lock_pid:
+            # A forked child, without os.register_at_fork().
+            with _g_fork_lock:
+                if pid != self._lock_pid:
+                    self._lock = threading.Lock()
+                    self._lock_pid = pid
+
+        with self._lock:
+            if pid != self._pid:
+                # First use, or a forked child: claim a region of our own.
+                self._claim_region(pid)
+
+            if self._region is None:
+                return
+
+            offset = self._entry_offset(command)
+            if offset is None:
+                return
+
+            offset += _NAME.size
+            self._increment(offset)
+            if error:
+                self._increment(offset + _COUNTER.size)
+            self._increment(offset + _COUNTER.size * 2,
+                            int(duration * 1000000))
+
+            bucket = 0
+            for bound in self.buckets:
+                if duration <= bound:
+                    break
+                bucket += 1
+            self._increment(offset + _COUNTER.size * (3 + bucket))
+
+    def _increment(self, offset, value=1):
+        current = _COUNTER.unpack_from(self._mmap, offset)[0]
+        _COUNTER.pack_into(self._mmap, offset, current + value)
+
+    def _entry_offset(self, command):
+        offset = self._entries.get(command)
+        if offset is not None:
+            return offset
+
+        name = command
+        if isinstance(name, bytes):
+            name = name.decode('utf-8', 'replace')
+
+        offset = self._entries.get(name)
+        if offset is None:
+            if self._num_entries >= self.commands:
+                return None
+
+            offset = (self._region_offset(self._region) + _PID.size +
+                      self._entry_size * self._num_entries)
+            _NAME.pack_into(self._mmap, offset,
+                            name.encode('utf-8')[:_NAME.size])
+            self._num_entries += 1
+            self._entries[name] = offset
+
+        self._entries[command] = offset
+        return offset
+
+    def _region_offset(self, region):
+        return self._regions_offset + self._region_size * region
+
+    def _claim_region(self, pid):
+        self._pid = pid
+        self._region = None
+        self._entries = {}
+        self._num_entries = 0
+
+        fd = os.open(self.path, os.O_RDWR)
+        try:
+            _lock(fd)
+            try:
+                for region in range(self.regions):
+                    offset = self._region_offset(region)
+                    owner = _PID.unpack_from(self._mmap, offset)[0]
+                    if owner == 0 or not _is_alive(owner):
+                        _PID.pack_into(self._mmap, offset, pid)
+                        self._region = region
+                        break
+            finally:
+                _unlock(fd)
+        finally:
+            os.close(fd)
+
+        if self._region is not None:
+            # Keep adding to the counts of a previous owner.
+            for command, offset in self._iter_entries(self._region):
+                self._entries[command] = offset
+                self._num_entries += 1
+
+    def _iter_entries(self, region):
+        offset = self._region_offset(region) + _PID.size
+        for i in range(self.commands):
+            name = _NAME.unpack_from(self._mmap, offset)[0].rstrip(b'\0')
+            if not name:
+                break
+
+            yield name.decode('utf-8', 'replace'), offset
+            offset += self._entry_size
+
+    def read(self):
+        """
+        Returns the metrics aggregated across all the processes, as
+        a dict mapping the command names to dicts with 'count',
+        'errors', 'total_time' (in seconds) and 'buckets' entries.
+        The buckets are paired with their upper bounds, the last one
+        being None.
+        """
+        bounds = self.buckets + (None,)
+        metrics = {}
+        for region in range(self.regions):
+            for command, offset in self._iter_entries(region):
+                values = struct.unpack_from(
+                    '<%dQ' % (3 + len(bounds)),
+                    self._mmap,
+                    offset + _NAME.size
+                )
+                stats = metrics.setdefault(command, {
+                    'count': 0,
+                    'errors': 0,
+                    'total_time': 0.0,
+                    'buckets': [0] * len(bounds),
+                })
+                stats['count'] += values[0]
+                stats['errors'] += values[1]
+                stats['total_time'] += values[2] / 1000000.0
+                for i, value in enumerate(values[3:]):
+                    stats['buckets'][i] += value
+
+        for stats in metrics.values():
+            stats['buckets'] = list(zip(bounds, stats['buckets']))
+
+        return metrics
+
+    def close(self):
+        self._mmap.close()
+
+
+def _reset_lock(ref):
+    # The lock may have been held by another thread at fork time.
+    metrics = ref()
+    if metrics is not None:
+        metrics._lock = threading.Lock()
+        metrics._lock_pid = os.getpid()
+
+
+def _is_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except OSError as exc:
+        return exc.errno == errno.EPERM
+
+    return True
+
+
+def _lock(fd):
+    if fcntl is not None:
+        fcntl.flock(fd, fcntl.LOCK_EX)
+
+
+def _unlock(fd):
+    if fcntl is not None:
+        fcntl.flock(fd, fcntl.LOCK_UN)
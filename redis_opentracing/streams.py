@@ -0,0 +1,222 @@
+import json
+import time
+
+import opentracing
+from opentracing.ext import tags
+
+from .constants import (
+    STREAM_BATCH_COMMAND,
+    STREAM_BATCH_SIZE_TAG,
+    STREAM_CONTEXT_FIELD,
+    STREAM_ENTRY_AGE_TAG,
+    STREAM_ENTRY_COMMAND,
+    STREAM_ENTRY_ID_TAG,
+    STREAM_MAX_ENTRY_AGE_TAG,
+    STREAM_NAME_TAG,
+    STREAM_PENDING_TAG,
+)
+from .tracing import _call_start_span_cb, _get_tracer, _set_base_span_tags
+
+
+def inject_stream_context(fields, span_context=None):
+    """
+    Returns a copy of the fields of a stream entry with the given
+    span context (by default, the one of the active span) embedded,
+    so consumers using trace_stream_batch() can link to it.
+
+    :param fields: the fields of the entry to be passed to XADD.
+    :param span_context: the span context to embed.
+    """
+    tracer = _get_tracer()
+    if span_context is None:
+        span = tracer.active_span
+        if span is None:
+            return fields
+
+        span_context = span.context
+
+    carrier = {}
+    tracer.inject(span_context, opentracing.Format.TEXT_MAP, carrier)
+
+    fields = dict(fields)
+    fields[STREAM_CONTEXT_FIELD] = json.dumps(carrier)
+    return fields
+
+
+def trace_stream_batch(reply, client=None, groupname=None,
+                       entry_spans=True):
+    """
+    Traces the processing of the entries returned by XREAD/XREADGROUP.
+
+    :param reply: the reply of xread() or xreadgroup().
+    :param client: the Redis client used to query the pending count
+        of every stream. Requires groupname.
+    :param groupname: the consumer group the entries were read with.
+    :param entry_spans: If True, each entry gets its own span, linked
+        to the producer span context embedded with inject_stream_context().
+
+    Used as a context manager, the batch span stays active while the
+    entries are processed, each yielded as a (stream, id, fields) tuple::
+
+        reply = client.xreadgroup('group', 'consumer', {'events': '>'})
+        with trace_stream_batch(reply) as batch:
+            for stream, entry_id, fields in batch:
+                process(fields)
+    """
+    return StreamBatch(_get_tracer(), reply, client, groupname, entry_spans)
+
+
+class StreamBatch(object):
+    def __init__(self, tracer, reply, client, groupname, entry_spans):
+        self._tracer = tracer
+        self._streams = _normalize_reply(reply)
+        self._client = client
+        self._groupname = groupname
+        self._entry_spans = entry_spans
+        self._scope = None
+        self._entry_scope = None
+        self._iterators = []
+
+    def __len__(self):
+        return sum(len(entries) for _, entries in self._streams)
+
+    def __enter__(self):
+        self._scope = self._tracer.start_active_span(STREAM_BATCH_COMMAND)
+        span = self._scope.span
+        _set_base_span_tags(span, '')
+        span.set_tag(STREAM_BATCH_SIZE_TAG, len(self))
+
+        now = _now_ms()
+        ages = [now - _entry_timestamp(entry_id)
+                for _, entries in self._streams
+                for entry_id, _ in entries]
+        if ages:
+            span.set_tag(STREAM_MAX_ENTRY_AGE_TAG, max(ages))
+
+        if self._client is not None and self._groupname is not None:
+            span.set_tag(STREAM_PENDING_TAG, self._pending_count())
+
+        _call_start_span_cb(span)
+        return self
+
+    def __exit__(self, exc_type, exc_value, tb):
+        if exc_value is not None and self._entry_scope is not None:
+            _set_error(self._entry_scope.span, exc_value)
+
+        # Finish any entry span left open by an interrupted iteration
+        # before the batch one.
+        for iterator in self._iterators:
+            iterator.close()
+
+        if exc_value is not None:
+            _set_error(self._scope.span, exc_value)
+
+        self._scope.close()
+        self._scope = None
+
+    def __iter__(self):
+        iterator = self._iter_entries()
+        self._iterators.append(iterator)
+        return iterator
+
+    def _iter_entries(self):
+        for stream, entries in self._streams:
+            for entry_id, fields in entries:
+                context, fields = self._extract_context(fields)
+                if not self._entry_spans:
+                    yield stream, entry_id, fields
+                    continue
+
+                with self._start_entry_span(context) as scope:
+                    span = scope.span
+                    span.set_tag(STREAM_NAME_TAG, _to_str(stream))
+                    span.set_tag(STREAM_ENTRY_ID_TAG, _to_str(entry_id))
+                    span.set_tag(STREAM_ENTRY_AGE_TAG,
+                                 _now_ms() - _entry_timestamp(entry_id))
+
+                    self._entry_scope = scope
+                    try:
+                        yield stream, entry_id, fields
+                    finally:
+                        self._entry_scope = None
+
+    def _start_entry_span(self, context):
+        references = []
+        if self._scope is not None:
+            references.append(opentracing.child_of(self._scope.span.context))
+        if context is not None:
+            references.append(opentracing.follows_from(context))
+
+        return self._tracer.start_active_span(STREAM_ENTRY_COMMAND,
+                                              references=references or None)
+
+    def _extract_context(self, fields):
+        if not fields:
+            return None, fields
+
+        key = STREAM_CONTEXT_FIELD
+        if key not in fields:
+            key = key.encode('utf-8')
+            if key not in fields:
+                return None, fields
+
+        fields = dict(fields)
+        carrier = fields.pop(key)
+        try:
+            carrier = json.loads(_to_str(carrier))
+            context = self._tracer.extract(opentracing.Format.TEXT_MAP,
+                                           carrier)
+        except Exception:
+            context = None
+
+        return context, fields
+
+    def _pending_count(self):
+        pending = 0
+        for stream, _ in self._streams:
+            try:
+                pending += self._client.xpending(stream,
+                                                 self._groupname)['pending']
+            except Exception:
+                pass
+
+        return pending
+
+
+def _set_error(span, exc):
+    span.set_tag(tags.ERROR, True)
+    span.log_kv({
+        'event': tags.ERROR,
+        'error.object': exc,
+    })
+
+
+def _normalize_reply(reply):
+    if not reply:
+        return []
+
+    if isinstance(reply, dict):
+        # RESP3 replies map the streams to their entries.
+        return [(stream, entries[0] if entries and
+                 isinstance(entries[0], list) else entries)
+                for stream, entries in reply.items()]
+
+    return [(stream, entries) for stream, entries in reply]
+
+
+def _entry_timestamp(entry_id):
+    try:
+        return int(_to_str(entry_id).split('-', 1)[0])
+    except ValueError:
+        return _now_ms()
+
+
+def _now_ms():
+    return int(time.time() * 1000)
+
+
+def _to_str(value):
+    if isinstance(value, bytes):
+        return value.decode('utf-8', 'replace')
+
+    return value
@@ -1,16 +1,77 @@
 from builtins import str
 from functools import wraps
+import threading
+import time
 
 import opentracing
 from opentracing.ext import tags
-import redis
+
+from .command import RedisCommand
+from .constants import (
+    CONTENTION_TAG,
+    KEY_TEMPLATE_TAG,
+    OVERHEAD_TAG,
+    POOL_WAIT_TIME_TAG,
+    SCAN_ITEMS_TAG,
+    SCAN_MATCH_TAG,
+    SCAN_PAGES_TAG,
+    SCAN_SERVER_TIME_TAG,
+    TRANSACTION_ATTEMPTS_TAG,
+    TRANSACTION_COMMAND,
+    TRANSACTION_RETRIES_TAG,
+)
+from .flight_recorder import STATUS_CONTENTION, STATUS_ERROR, STATUS_OK
+from .import_hook import _remove_hooks, when_imported
+from .key_templates import _get_command_name, _get_keys
+from .n_plus_one import NPlusOneDetector
+from .overhead import (
+    CALLBACK,
+    FORMAT,
+    START,
+    _g_overhead_stats,
+    _OverheadTimer,
+)
+from .pool import _get_stats
+from .transaction import _record_contention, _reset_contention_stats
 
 _g_tracer = None
 _g_trace_all_classes = None
 _g_start_span_cb = None
-
-
-def init_tracing(tracer=None, trace_all_classes=True, start_span_cb=None):
+_g_start_span_cb_command = False
+_g_finish_span_cb = None
+_g_flight_recorder = None
+_g_shared_metrics = None
+_g_trace_spans = True
+_g_n_plus_one_detector = None
+_g_key_normalizer = None
+_g_key_template_in_operation_name = False
+_g_command_recorder = None
+_g_measure_overhead = False
+_g_overhead_tag = False
+_g_span_worker = None
+
+# Per-thread state, e.g. the scan iteration
+# whose pages are being fetched.
+_g_local = threading.local()
+
+# The scan iterators, along with their command
+# and the position of their match argument.
+_SCAN_ITER_METHODS = (
+    ('scan_iter', 'SCAN', 0),
+    ('hscan_iter', 'HSCAN', 1),
+    ('sscan_iter', 'SSCAN', 1),
+    ('zscan_iter', 'ZSCAN', 1),
+)
+
+
+def init_tracing(tracer=None, trace_all_classes=True, start_span_cb=None,
+                 flight_recorder=None, trace_spans=True,
+                 deferred_patching=False, shared_metrics=None,
+                 n_plus_one_threshold=None, key_normalizer=None,
+                 key_template_in_operation_name=False,
+                 command_recorder=None, measure_overhead=False,
+                 overhead_tag=False, finish_span_cb=None,
+                 span_worker=None, start_span_cb_command=False):
     """
     Set our tracer for Redis. Tracer objects from the
     OpenTracing django/flask/pyramid libraries can be passed as well.
@@ -19,20 +80,89 @@ def init_tracing(tracer=None, trace_all_classes=True, start_span_cb=None):
     :param trace_all_classes: If True, Redis clients and pipelines
         are automatically traced. Else, explicit tracing on them
         is required.
+    :param start_span_cb: a callable called with every new span.
+    :param flight_recorder: a FlightRecorder object, keeping a record
+        of the last traced commands.
+    :param trace_spans: If False, no spans are created for the traced
+        commands, and only the flight recorder and the shared
+        metrics are fed.
+    :param deferred_patching: If True, the Redis classes are patched
+        only once their modules are first imported, instead of
+        importing them right away.
+    :param shared_metrics: a SharedMetrics object, aggregating the
+        per-command counters across processes.
+    :param n_plus_one_threshold: If set, the active span is tagged
+        once this number of consecutive non-pipelined commands of
+        the same type are executed under it, as they are likely
+        better executed through a pipeline or a multi-key command.
+    :param key_normalizer: a KeyNormalizer object (or a callable)
+        turning the keys of the commands into templates, set as
+        the 'redis.key_template' tag.
+    :param key_template_in_operation_name: If True, the key template
+        is appended to the operation name, e.g. 'GET user:{id}'.
+    :param command_recorder: a CommandRecorder object, writing the
+        traced commands to a file that can be replayed later.
+    :param measure_overhead: If True, the time spent in tracing work
+        (starting and finishing the spans, formatting the statements,
+        calling start_span_cb) is measured apart from the Redis calls,
+        and available through get_overhead_stats().
+    :param overhead_tag: If True, the measured tracing time (in
+        milliseconds, up to the end of the Redis call) is set as the
+        'redis.tracing.overhead_ms' tag. Implies measure_overhead.
+    :param finish_span_cb: a callable called with the span and the
+        RedisCommand object (along with its duration, result and
+        exception) once the Redis call returns, before the span
+        finishes.
+    :param span_worker: a SpanWorker object. If set, the spans of the
+        commands and pipelines are created and finished on its
+        background thread, with the timestamps taken around the
+        Redis calls, and the callbacks are called from there.
+    :param start_span_cb_command: If True, start_span_cb is also
+        called with a RedisCommand object describing the traced
+        command, as its second argument.
     """
     if start_span_cb is not None and not callable(start_span_cb):
         raise ValueError('start_span_cb is not callable')
 
-    global _g_tracer, _g_trace_all_classes, _g_start_span_cb
+    if finish_span_cb is not None and not callable(finish_span_cb):
+        raise ValueError('finish_span_cb is not callable')
+
+    global _g_tracer, _g_trace_all_classes, _g_start_span_cb, \
+        _g_flight_recorder, _g_shared_metrics, _g_trace_spans, \
+        _g_n_plus_one_detector, _g_key_normalizer, \
+        _g_key_template_in_operation_name, _g_command_recorder, \
+        _g_measure_overhead, _g_overhead_tag, _g_start_span_cb_command, \
+        _g_finish_span_cb, _g_span_worker
     if hasattr(tracer, '_tracer'):
         tracer = tracer._tracer
 
     _g_tracer = tracer
     _g_trace_all_classes = trace_all_classes
     _g_start_span_cb = start_span_cb
+    _g_start_span_cb_command = start_span_cb is not None and \
+        start_span_cb_command
+    _g_finish_span_cb = finish_span_cb
+    _g_span_worker = span_worker
+    _g_flight_recorder = flight_recorder
+    _g_shared_metrics = shared_metrics
+    _g_trace_spans = trace_spans
+    _g_n_plus_one_detector = None
+    if n_plus_one_threshold is not None:
+        _g_n_plus_one_detector = NPlusOneDetector(n_plus_one_threshold)
+    _g_key_normalizer = key_normalizer
+    _g_key_template_in_operation_name = key_template_in_operation_name
+    _g_command_recorder = command_recorder
+    _g_measure_overhead = measure_overhead or overhead_tag
+    _g_overhead_tag = overhead_tag
+    _g_overhead_stats.reset()
 
     if _g_trace_all_classes:
-        _patch_redis_classes()
+        if deferred_patching:
+            when_imported('redis.client', _patch_client_module)
+            when_imported('redis.connection', _patch_connection_module)
+            when_imported('redis.cluster', _patch_cluster_module)
+        else:
+            _patch_redis_classes()
 
 
 def trace_client(client):
@@ -69,9 +199,37 @@ def trace_pubsub(pubsub):
     _patch_pubsub(pubsub)
 
 
+def trace_connection_pool(pool):
+    """
+    Marks a connection pool to be traced.
+
+    :param pool: the Redis connection pool object to be traced.
+    The time spent waiting for a connection will be set as a tag
+    on the active span, and the pool gauges will be available
+    through get_pool_stats().
+    """
+    _patch_pool(pool)
+
+
 def _reset_tracing():
-    global _g_tracer, _g_trace_all_classes, _g_start_span_cb
+    global _g_tracer, _g_trace_all_classes, _g_start_span_cb, \
+        _g_flight_recorder, _g_shared_metrics, _g_trace_spans, \
+        _g_n_plus_one_detector, _g_key_normalizer, \
+        _g_key_template_in_operation_name, _g_command_recorder, \
+        _g_measure_overhead, _g_overhead_tag, _g_start_span_cb_command, \
+        _g_finish_span_cb, _g_span_worker
     _g_tracer = _g_trace_all_classes = _g_start_span_cb = None
+    _g_start_span_cb_command = False
+    _g_finish_span_cb = _g_span_worker = None
+    _g_flight_recorder = _g_shared_metrics = None
+    _g_n_plus_one_detector = _g_key_normalizer = None
+    _g_key_template_in_operation_name = False
+    _g_command_recorder = None
+    _g_trace_spans = True
+    _g_measure_overhead = _g_overhead_tag = False
+    _g_overhead_stats.reset()
+    _reset_contention_stats()
+    _remove_hooks()
 
 
 def _get_tracer():
@@ -95,11 +253,29 @@ def _set_base_span_tags(span, stmt):
 
 
 def _patch_redis_classes():
+    import redis.client
+    import redis.connection
+
+    _patch_client_module(redis.client)
+    _patch_connection_module(redis.connection)
+
+    try:
+        import redis.cluster
+    except ImportError:
+        # Cluster support requires redis-py 4.1 or newer.
+        pass
+    else:
+        _patch_cluster_module(redis.cluster)
+
+
+def _patch_client_module(module):
+    klass = module.StrictRedis
+
     # Patch the outgoing commands.
-    _patch_obj_execute_command(redis.StrictRedis, True)
+    _patch_obj_execute_command(klass, True)
 
     # Patch the created pipelines.
-    pipeline_method = redis.StrictRedis.pipeline
+    pipeline_method = klass.pipeline
 
     @wraps(pipeline_method)
     def tracing_pipeline(self, transaction=True, shard_hint=None):
@@ -107,10 +283,10 @@ def _patch_redis_classes():
         _patch_pipe_execute(pipe)
         return pipe
 
-    redis.StrictRedis.pipeline = tracing_pipeline
+    klass.pipeline = tracing_pipeline
 
     # Patch the created pubsubs.
-    pubsub_method = redis.StrictRedis.pubsub
+    pubsub_method = klass.pubsub
 
     @wraps(pubsub_method)
     def tracing_pubsub(self, **kwargs):
@@ -118,7 +294,25 @@ def _patch_redis_classes():
         _patch_pubsub(pubsub)
         return pubsub
 
-    redis.StrictRedis.pubsub = tracing_pubsub
+    klass.pubsub = tracing_pubsub
+
+    # Patch the optimistic transactions.
+    _patch_transaction(klass, True)
+
+    # Patch the scan iterators.
+    _patch_scan_iters(klass, True)
+
+
+def _patch_connection_module(module):
+    # Patch the connection pools checkout/release.
+    _patch_pool(module.ConnectionPool, True)
+    _patch_pool(module.BlockingConnectionPool, True)
+
+
+def _patch_cluster_module(module):
+    # Patch the outgoing cluster commands. Their pipelines
+    # keep a different command stack, and are not traced.
+    _patch_obj_execute_command(module.RedisCluster, True)
 
 
 def _patch_client(client):
@@ -147,6 +341,12 @@ def _patch_client(client):
 
     client.pubsub = tracing_pubsub
 
+    # Patch the optimistic transactions.
+    _patch_transaction(client)
+
+    # Patch the scan iterators.
+    _patch_scan_iters(client)
+
 
 def _patch_pipe_execute(pipe):
     tracer = _get_tracer()
@@ -160,21 +360,59 @@ def _patch_pipe_execute(pipe):
             # Nothing to process/handle.
             return execute_method(raise_on_error=raise_on_error)
 
-        with tracer.start_active_span('MULTI') as scope:
-            span = scope.span
-            _set_base_span_tags(span, _normalize_stmts(pipe.command_stack))
-
-            _call_start_span_cb(span)
-
-            try:
-                res = execute_method(raise_on_error=raise_on_error)
-            except Exception as exc:
-                span.set_tag(tags.ERROR, True)
-                span.log_kv({
-                    'event': tags.ERROR,
-                    'error.object': exc,
-                })
-                raise
+        if _g_n_plus_one_detector is not None:
+            _g_n_plus_one_detector.break_streak(tracer.active_span)
+
+        if not _g_trace_spans:
+            return _call_recorded(('MULTI',), execute_method, (),
+                                  {'raise_on_error': raise_on_error},
+                                  pipe.command_stack, pipe.transaction)
+
+        if _g_span_worker is not None:
+            return _call_deferred(tracer, ('MULTI',), execute_method, (),
+                                  {'raise_on_error': raise_on_error},
+                                  pipe.command_stack, pipe.transaction)
+
+        command = _new_command(('MULTI',), pipe.command_stack,
+                               pipe.transaction)
+        timer = _start_overhead_timer()
+        try:
+            with tracer.start_active_span('MULTI') as scope:
+                span = scope.span
+                _lap_overhead(timer, START)
+                _set_base_span_tags(span,
+                                    _normalize_stmts(pipe.command_stack))
+                _lap_overhead(timer, FORMAT)
+
+                _call_start_span_cb(span, command)
+                _lap_overhead(timer, CALLBACK)
+
+                start_time = time.time()
+                try:
+                    res = _call_recorded(('MULTI',), execute_method, (),
+                                         {'raise_on_error': raise_on_error},
+                                         pipe.command_stack, pipe.transaction)
+                except Exception as exc:
+                    _skip_overhead(timer, span)
+                    if _is_watch_error(exc):
+                        # A watched key changed: contention, not an error.
+                        span.set_tag(CONTENTION_TAG, True)
+                        span.log_kv({'event': 'contention'})
+                    else:
+                        span.set_tag(tags.ERROR, True)
+                        span.log_kv({
+                            'event': tags.ERROR,
+                            'error.object': exc,
+                        })
+
+                    _call_finish_span_cb(span, command, start_time,
+                                         exc=exc)
+                    raise
+
+                _skip_overhead(timer, span)
+                _call_finish_span_cb(span, command, start_time, res)
+        finally:
+            _finish_overhead(timer)
 
         return res
 
@@ -185,23 +423,133 @@ def _patch_pipe_execute(pipe):
 
     @wraps(immediate_execute_method)
     def tracing_immediate_execute_command(*args, **options):
-        command = args[0]
-        with tracer.start_active_span(command) as scope:
+        if not _g_trace_spans:
+            return _call_recorded(args, immediate_execute_method,
+                                  args, options)
+
+        if _g_span_worker is not None:
+            return _call_deferred(tracer, args, immediate_execute_method,
+                                  args, options)
+
+        command = _new_command(args)
+        timer = _start_overhead_timer()
+        try:
+            with _start_command_span(tracer, args) as scope:
+                span = scope.span
+                _lap_overhead(timer, START)
+                _set_base_span_tags(span, _normalize_stmt(args))
+                _lap_overhead(timer, FORMAT)
+
+                _call_start_span_cb(span, command)
+                _lap_overhead(timer, CALLBACK)
+
+                start_time = time.time()
+                try:
+                    rv = _call_recorded(args, immediate_execute_method,
+                                        args, options)
+                except Exception as exc:
+                    _skip_overhead(timer, span)
+                    span.set_tag(tags.ERROR, True)
+                    span.log_kv({
+                        'event': tags.ERROR,
+                        'error.object': exc,
+                    })
+                    _call_finish_span_cb(span, command, start_time, exc=exc)
+                    raise
+
+                _skip_overhead(timer, span)
+                _call_finish_span_cb(span, command, start_time, rv)
+        finally:
+            _finish_overhead(timer)
+
+        return rv
+
+    pipe.immediate_execute_command = tracing_immediate_execute_command
+
+
+def _patch_transaction(redis_obj, is_klass=False):
+    tracer = _get_tracer()
+
+    transaction_method = redis_obj.transaction
+
+    @wraps(transaction_method)
+    def tracing_transaction(*args, **kwargs):
+        if is_klass:
+            # Unbound method, we will get 'self' in args.
+            client, func, watches = args[0], args[1], args[2:]
+        else:
+            client, func, watches = redis_obj, args[0], args[1:]
+
+        if not _g_trace_spans:
+            return transaction_method(*args, **kwargs)
+
+        shard_hint = kwargs.pop('shard_hint', None)
+        value_from_callable = kwargs.pop('value_from_callable', False)
+        watch_delay = kwargs.pop('watch_delay', None)
+
+        command = _new_command((TRANSACTION_COMMAND,) + watches)
+        with tracer.start_active_span(TRANSACTION_COMMAND) as scope:
             span = scope.span
-            _set_base_span_tags(span, _normalize_stmt(args))
+            stmt = _normalize_stmt(('WATCH',) + watches) if watches else ''
+            _set_base_span_tags(span, stmt)
 
-            _call_start_span_cb(span)
+            _call_start_span_cb(span, command)
 
+            start_time = time.time()
+            attempts = 0
             try:
-                immediate_execute_method(*args, **options)
-            except Exception as exc:
-                span.set_tag(tags.ERROR, True)
-                span.log_kv({
-                    'event': tags.ERROR,
-                    'error.object': exc,
-                })
-
-    pipe.immediate_execute_command = tracing_immediate_execute_command
+                with client.pipeline(True, shard_hint) as pipe:
+                    while True:
+                        attempts += 1
+                        attempt_time = time.time()
+                        try:
+                            if watches:
+                                pipe.watch(*watches)
+                            func_value = func(pipe)
+                            exec_value = pipe.execute()
+                        except Exception as exc:
+                            if _is_watch_error(exc):
+                                _log_attempt(span, attempts, attempt_time,
+                                             'contention')
+                                _record_contention(watches,
+                                                   _g_key_normalizer)
+                                if watch_delay is not None and \
+                                        watch_delay > 0:
+                                    time.sleep(watch_delay)
+                                continue
+
+                            _log_attempt(span, attempts, attempt_time,
+                                         tags.ERROR)
+                            span.set_tag(tags.ERROR, True)
+                            span.log_kv({
+                                'event': tags.ERROR,
+                                'error.object': exc,
+                            })
+                            _call_finish_span_cb(span, command, start_time,
+                                                 exc=exc)
+                            raise
+
+                        _log_attempt(span, attempts, attempt_time, 'ok')
+                        rv = func_value if value_from_callable \
+                            else exec_value
+                        _call_finish_span_cb(span, command, start_time, rv)
+                        return rv
+            finally:
+                span.set_tag(TRANSACTION_ATTEMPTS_TAG, attempts)
+                span.set_tag(TRANSACTION_RETRIES_TAG, max(attempts - 1, 0))
+                if attempts > 1:
+                    span.set_tag(CONTENTION_TAG, True)
+
+    redis_obj.transaction = tracing_transaction
+
+
+def _log_attempt(span, attempt, start_time, outcome):
+    span.log_kv({
+        'event': 'attempt',
+        'attempt': attempt,
+        'outcome': outcome,
+        'duration': time.time() - start_time,
+    })
 
 
 def _patch_pubsub(pubsub):
@@ -217,12 +565,17 @@ def _patch_pubsub_parse_response(pubsub):
 
     @wraps(parse_response_method)
     def tracing_parse_response(block=True, timeout=0):
+        if not _g_trace_spans:
+            return parse_response_method(block=block, timeout=timeout)
+
+        command = _new_command(('SUB',))
         with tracer.start_active_span('SUB') as scope:
             span = scope.span
             _set_base_span_tags(span, '')
 
-            _call_start_span_cb(span)
+            _call_start_span_cb(span, command)
 
+            start_time = time.time()
             try:
                 rv = parse_response_method(block=block, timeout=timeout)
             except Exception as exc:
@@ -231,8 +584,11 @@ def _patch_pubsub_parse_response(pubsub):
                     'event': tags.ERROR,
                     'error.object': exc,
                 })
+                _call_finish_span_cb(span, command, start_time, exc=exc)
                 raise
 
+            _call_finish_span_cb(span, command, start_time, rv)
+
         return rv
 
     pubsub.parse_response = tracing_parse_response
@@ -251,34 +607,486 @@ def _patch_obj_execute_command(redis_obj, is_klass=False):
         else:
             reported_args = args
 
-        command = reported_args[0]
+        scan = getattr(_g_local, 'scan', None)
+        if scan is not None:
+            # The pages of a traced scan iteration
+            # are aggregated in its span.
+            return scan.fetch_page(reported_args, execute_command_method,
+                                   args, kwargs)
+
+        detector = _g_n_plus_one_detector
+        if detector is None:
+            return _execute_command(tracer, reported_args,
+                                    execute_command_method, args, kwargs)
+
+        return detector.call(tracer.active_span, reported_args[0],
+                             _execute_command, tracer, reported_args,
+                             execute_command_method, args, kwargs)
+
+    redis_obj.execute_command = tracing_execute_command
+
+
+def _get_operation_name(reported_args):
+    # Returns the operation name along with the key template, if any.
+    command = reported_args[0]
+    if _g_key_normalizer is None or len(reported_args) < 2:
+        return command, None
+
+    keys = _get_keys(_get_command_name(reported_args), reported_args)
+    if not keys:
+        return command, None
+
+    template = _g_key_normalizer(keys[0])
+    if _g_key_template_in_operation_name:
+        return '%s %s' % (command, template), template
+
+    return command, template
+
+
+def _start_command_span(tracer, reported_args):
+    operation_name, template = _get_operation_name(reported_args)
+    scope = tracer.start_active_span(operation_name)
+    if template is not None:
+        scope.span.set_tag(KEY_TEMPLATE_TAG, template)
 
-        with tracer.start_active_span(command) as scope:
+    return scope
+
+
+def _execute_command(tracer, reported_args, method, args, kwargs):
+    if not _g_trace_spans:
+        return _call_recorded(reported_args, method, args, kwargs)
+
+    if _g_span_worker is not None:
+        return _call_deferred(tracer, reported_args, method, args, kwargs)
+
+    command = _new_command(reported_args)
+    timer = _start_overhead_timer()
+    try:
+        with _start_command_span(tracer, reported_args) as scope:
             span = scope.span
+            _lap_overhead(timer, START)
             _set_base_span_tags(span, _normalize_stmt(reported_args))
+            _lap_overhead(timer, FORMAT)
 
-            _call_start_span_cb(span)
+            _call_start_span_cb(span, command)
+            _lap_overhead(timer, CALLBACK)
 
+            start_time = time.time()
             try:
-                rv = execute_command_method(*args, **kwargs)
+                rv = _call_recorded(reported_args, method, args, kwargs)
             except Exception as exc:
+                _skip_overhead(timer, span)
                 span.set_tag(tags.ERROR, True)
                 span.log_kv({
                     'event': tags.ERROR,
                     'error.object': exc,
                 })
+                _call_finish_span_cb(span, command, start_time, exc=exc)
                 raise
 
-        return rv
+            _skip_overhead(timer, span)
+            _call_finish_span_cb(span, command, start_time, rv)
+    finally:
+        _finish_overhead(timer)
+
+    return rv
+
+
+class _DeferredSpan(object):
+    # What the worker needs to build the span of a command.
+    __slots__ = ('tracer', 'parent', 'reported_args', 'command_stack',
+                 'transaction', 'timer', 'start_time', 'finish_time',
+                 'pool_wait_time', 'result', 'exc')
+
+    def __init__(self, tracer, parent, reported_args, command_stack,
+                 transaction, timer):
+        self.tracer = tracer
+        self.parent = parent
+        self.reported_args = reported_args
+        self.command_stack = command_stack
+        self.transaction = transaction
+        self.timer = timer
+        self.start_time = None
+        self.finish_time = None
+        self.pool_wait_time = None
+        self.result = None
+        self.exc = None
+
+
+def _call_deferred(tracer, reported_args, method, args, kwargs,
+                   command_stack=None, transaction=False):
+    # Only the parent, the pool wait and the timestamps are
+    # captured here, the span being built by the worker.
+    timer = _start_overhead_timer()
+    deferred = _DeferredSpan(tracer, tracer.active_span, reported_args,
+                             command_stack, transaction, timer)
+    prev_deferred = getattr(_g_local, 'deferred', None)
+    _g_local.deferred = deferred
+    _lap_overhead(timer, START)
+
+    deferred.start_time = time.time()
+    try:
+        deferred.result = _call_recorded(reported_args, method, args, kwargs,
+                                         command_stack, transaction)
+    except Exception as exc:
+        deferred.exc = exc
+        raise
+    finally:
+        deferred.finish_time = time.time()
+        _g_local.deferred = prev_deferred
+        _g_span_worker.submit(_finish_deferred_span, deferred)
+
+    return deferred.result
+
+
+def _finish_deferred_span(deferred):
+    timer = deferred.timer
+    if timer is not None:
+        # Leaves out the Redis call and the time spent in the queue.
+        timer.skip()
+
+    reported_args = deferred.reported_args
+    command_stack = deferred.command_stack
+    finish_time = deferred.finish_time
+    exc = deferred.exc
+
+    if command_stack is None:
+        operation_name, template = _get_operation_name(reported_args)
+    else:
+        operation_name, template = reported_args[0], None
+
+    span = deferred.tracer.start_span(operation_name,
+                                      child_of=deferred.parent,
+                                      start_time=deferred.start_time)
+    try:
+        _lap_overhead(timer, START)
+        if template is not None:
+            span.set_tag(KEY_TEMPLATE_TAG, template)
 
-    redis_obj.execute_command = tracing_execute_command
+        if command_stack is None:
+            _set_base_span_tags(span, _normalize_stmt(reported_args))
+        else:
+            _set_base_span_tags(span, _normalize_stmts(command_stack))
+
+        if deferred.pool_wait_time is not None:
+            span.set_tag(POOL_WAIT_TIME_TAG,
+                         deferred.pool_wait_time * 1000.0)
+        _lap_overhead(timer, FORMAT)
+
+        command = _new_command(reported_args, command_stack,
+                               deferred.transaction)
+        _call_start_span_cb(span, command)
+        _lap_overhead(timer, CALLBACK)
+
+        if timer is not None and _g_overhead_tag:
+            span.set_tag(OVERHEAD_TAG, timer.total * 1000.0)
+
+        if exc is not None:
+            if command_stack is not None and _is_watch_error(exc):
+                span.set_tag(CONTENTION_TAG, True)
+                span.log_kv({'event': 'contention'}, finish_time)
+            else:
+                span.set_tag(tags.ERROR, True)
+                span.log_kv({
+                    'event': tags.ERROR,
+                    'error.object': exc,
+                }, finish_time)
+
+        _call_finish_span_cb(span, command, deferred.start_time,
+                             deferred.result, exc, finish_time)
+    finally:
+        span.finish(finish_time)
+        _finish_overhead(timer)
+
+
+def _patch_scan_iters(redis_obj, is_klass=False):
+    for name, command, match_index in _SCAN_ITER_METHODS:
+        if hasattr(redis_obj, name):
+            _patch_scan_iter(redis_obj, name, command, match_index, is_klass)
+
+
+def _patch_scan_iter(redis_obj, name, command, match_index, is_klass):
+    tracer = _get_tracer()
+
+    scan_iter_method = getattr(redis_obj, name)
+
+    @wraps(scan_iter_method)
+    def tracing_scan_iter(*args, **kwargs):
+        if not _g_trace_spans:
+            return scan_iter_method(*args, **kwargs)
+
+        reported_args = args[1:] if is_klass else args
+        if len(reported_args) > match_index:
+            match = reported_args[match_index]
+        else:
+            match = kwargs.get('match')
+
+        stmt_args = (command,) + tuple(reported_args[:match_index])
+        if match is not None:
+            stmt_args += ('MATCH', match)
+
+        return _traced_scan_iter(tracer, name.upper(), stmt_args, match,
+                                 scan_iter_method(*args, **kwargs))
+
+    setattr(redis_obj, name, tracing_scan_iter)
+
+
+class _ScanState(object):
+    def __init__(self):
+        self.pages = 0
+        self.items = 0
+        self.server_time = 0.0
+
+    def fetch_page(self, reported_args, method, args, kwargs):
+        start_time = time.time()
+        try:
+            return _call_recorded(reported_args, method, args, kwargs)
+        finally:
+            self.pages += 1
+            self.server_time += time.time() - start_time
+
+
+def _traced_scan_iter(tracer, operation_name, stmt_args, match, iterator):
+    # The span is not activated, as the iteration is
+    # interleaved with the code consuming it.
+    span = tracer.start_span(operation_name)
+    _set_base_span_tags(span, _normalize_stmt(stmt_args))
+    if match is not None:
+        span.set_tag(SCAN_MATCH_TAG, str(match))
+
+    command = _new_command((operation_name,) + stmt_args[1:])
+    _call_start_span_cb(span, command)
+
+    start_time = time.time()
+    scan = _ScanState()
+    error = None
+    try:
+        while True:
+            prev_scan = getattr(_g_local, 'scan', None)
+            _g_local.scan = scan
+            try:
+                item = next(iterator)
+            except StopIteration:
+                break
+            finally:
+                _g_local.scan = prev_scan
+
+            scan.items += 1
+            yield item
+    except Exception as exc:
+        span.set_tag(tags.ERROR, True)
+        span.log_kv({
+            'event': tags.ERROR,
+            'error.object': exc,
+        })
+        error = exc
+        raise
+    finally:
+        span.set_tag(SCAN_PAGES_TAG, scan.pages)
+        span.set_tag(SCAN_ITEMS_TAG, scan.items)
+        span.set_tag(SCAN_SERVER_TIME_TAG, scan.server_time * 1000.0)
+        # Also called when the iteration is stopped early.
+        _call_finish_span_cb(span, command, start_time, exc=error)
+        span.finish()
+
+
+def _patch_pool(pool, is_klass=False):
+    def should_patch(name):
+        # Only patch the methods a pool class defines itself,
+        # so inherited ones are not wrapped twice.
+        return not is_klass or name in vars(pool)
+
+    def get_pool(args):
+        return args[0] if is_klass else pool
+
+    if should_patch('get_connection'):
+        get_connection_method = pool.get_connection
+
+        @wraps(get_connection_method)
+        def tracing_get_connection(*args, **kwargs):
+            stats = _get_stats(get_pool(args))
+            stats.on_wait_start()
+            start_time = time.time()
+            conn = None
+            try:
+                conn = get_connection_method(*args, **kwargs)
+            finally:
+                wait_time = time.time() - start_time
+                stats.on_wait_end(wait_time, conn)
+
+            deferred = getattr(_g_local, 'deferred', None)
+            if deferred is not None:
+                # The span of the command is built by the span worker.
+                deferred.pool_wait_time = wait_time
+            else:
+                span = _get_tracer().active_span
+                if span is not None:
+                    span.set_tag(POOL_WAIT_TIME_TAG, wait_time * 1000.0)
+
+            return conn
+
+        pool.get_connection = tracing_get_connection
+
+    if should_patch('release'):
+        release_method = pool.release
+
+        @wraps(release_method)
+        def tracing_release(*args, **kwargs):
+            conn_args = args[1:] if is_klass else args
+            conn = conn_args[0] if conn_args else kwargs.get('connection')
+            _get_stats(get_pool(args)).on_release(conn)
+            return release_method(*args, **kwargs)
+
+        pool.release = tracing_release
+
+    if should_patch('make_connection'):
+        make_connection_method = pool.make_connection
+
+        @wraps(make_connection_method)
+        def tracing_make_connection(*args, **kwargs):
+            conn = make_connection_method(*args, **kwargs)
+            _get_stats(get_pool(args)).on_created()
+            return conn
+
+        pool.make_connection = tracing_make_connection
+
+    if should_patch('reset'):
+        reset_method = pool.reset
+
+        @wraps(reset_method)
+        def tracing_reset(*args, **kwargs):
+            rv = reset_method(*args, **kwargs)
+            pool_obj = get_pool(args)
+            _get_stats(pool_obj).on_reset(
+                getattr(pool_obj, 'max_connections', None)
+            )
+            return rv
+
+        pool.reset = tracing_reset
+
+
+def _is_watch_error(exc):
+    # Imported here, so redis is not imported along with this module.
+    from redis.exceptions import WatchError
+    return isinstance(exc, WatchError)
+
+
+def _call_recorded(reported_args, method, args, kwargs,
+                   command_stack=None, transaction=False):
+    if _g_flight_recorder is None and _g_shared_metrics is None and \
+            _g_command_recorder is None:
+        return method(*args, **kwargs)
+
+    status = STATUS_OK
+    start_time = time.time()
+    try:
+        return method(*args, **kwargs)
+    except Exception as exc:
+        status = STATUS_CONTENTION if _is_watch_error(exc) else STATUS_ERROR
+        raise
+    finally:
+        _record_command(reported_args, command_stack, transaction,
+                        start_time, time.time() - start_time, status)
+
+
+def _record_command(reported_args, command_stack, transaction,
+                    start_time, duration, status):
+    # The recorders are fed independently, and their errors dropped,
+    # so they can neither break nor mask the command.
+    command = reported_args[0]
+
+    recorder = _g_flight_recorder
+    if recorder is not None:
+        try:
+            keys = _get_keys(_get_command_name(reported_args),
+                             reported_args)
+            key = keys[0] if keys else None
+            recorder.record(command, key, start_time, duration, status)
+        except Exception:
+            pass
+
+    metrics = _g_shared_metrics
+    if metrics is not None:
+        try:
+            metrics.record(command, duration, status == STATUS_ERROR)
+        except Exception:
+            pass
+
+    command_recorder = _g_command_recorder
+    if command_recorder is not None:
+        try:
+            if command_stack is None:
+                command_recorder.record_command(start_time, reported_args)
+            else:
+                command_recorder.record_pipeline(
+                    start_time,
+                    [command[0] for command in command_stack],
+                    transaction
+                )
+        except Exception:
+            pass
+
+
+def _start_overhead_timer():
+    if not _g_measure_overhead:
+        return None
+
+    return _OverheadTimer(_g_overhead_stats)
+
+
+def _lap_overhead(timer, phase):
+    if timer is not None:
+        timer.lap(phase)
+
+
+def _skip_overhead(timer, span):
+    # Leaves the Redis call out of the measured time.
+    if timer is None:
+        return
+
+    timer.skip()
+    if _g_overhead_tag:
+        span.set_tag(OVERHEAD_TAG, timer.total * 1000.0)
+
+
+def _finish_overhead(timer):
+    if timer is not None:
+        timer.done()
+
+
+def _new_command(args, command_stack=None, transaction=None):
+    # Only built when a callback gets it.
+    if _g_finish_span_cb is None and not _g_start_span_cb_command:
+        return None
+
+    return RedisCommand(args, command_stack, transaction)
 
 
-def _call_start_span_cb(span):
+def _call_start_span_cb(span, command=None):
     if _g_start_span_cb is None:
         return
 
     try:
-        _g_start_span_cb(span)
+        if _g_start_span_cb_command:
+            _g_start_span_cb(span, command)
+        else:
+            _g_start_span_cb(span)
+    except Exception:
+        pass
+
+
+def _call_finish_span_cb(span, command, start_time, result=None, exc=None,
+                         finish_time=None):
+    if _g_finish_span_cb is None:
+        return
+
+    if finish_time is None:
+        finish_time = time.time()
+
+    command.duration = finish_time - start_time
+    command.result = result
+    command.exception = exc
+    try:
+        _g_finish_span_cb(span, command)
     except Exception:
         pass
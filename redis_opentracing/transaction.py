@@ -0,0 +1,33 @@
+import threading
+
+from .key_templates import KeyNormalizer
+
+_g_default_normalizer = KeyNormalizer()
+
+_g_contention_lock = threading.Lock()
+_g_contention_counts = {}
+
+
+def _record_contention(watches, normalizer=None):
+    if normalizer is None:
+        normalizer = _g_default_normalizer
+
+    patterns = set(normalizer(key) for key in watches)
+    with _g_contention_lock:
+        for pattern in patterns:
+            _g_contention_counts[pattern] = \
+                _g_contention_counts.get(pattern, 0) + 1
+
+
+def _reset_contention_stats():
+    with _g_contention_lock:
+        _g_contention_counts.clear()
+
+
+def get_contention_stats():
+    """
+    Returns a dict mapping the watched key patterns to the number
+    of times a traced transaction had to be retried because of them.
+    """
+    with _g_contention_lock:
+        return dict(_g_contention_counts)
@@ -0,0 +1,91 @@
+import os
+import queue
+import threading
+
+
+class SpanWorker(object):
+    """
+    Runs the tracing work of the wrappers (formatting the statements,
+    setting the tags, finishing the spans with explicit timestamps)
+    on a background thread, keeping it off the calling thread.
+
+    The work goes through a bounded queue, and is dropped (and
+    counted in dropped) when the queue is full.
+
+    :param queue_size: the maximum number of pending spans.
+    """
+
+    def __init__(self, queue_size=1024):
+        self.queue_size = queue_size
+        self._lock = threading.Lock()
+        self._dropped = 0
+        self._pid = None
+        self._queue = None
+        self._thread = None
+
+    @property
+    def dropped(self):
+        """
+        The number of spans dropped because the queue was full.
+        """
+        with self._lock:
+            return self._dropped
+
+    def submit(self, func, *args):
+        if self._pid != os.getpid():
+            # First use, or the worker thread was lost in a fork.
+            self._start()
+
+        try:
+            self._queue.put_nowait((func, args))
+        except queue.Full:
+            with self._lock:
+                self._dropped += 1
+
+    def _start(self):
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+
+            self._queue = queue.Queue(self.queue_size)
+            self._thread = threading.Thread(target=self._run,
+                                            args=(self._queue,),
+                                            name='redis-opentracing-worker')
+            self._thread.daemon = True
+            self._thread.start()
+            self._pid = os.getpid()
+
+    def _run(self, work_queue):
+        while True:
+            item = work_queue.get()
+            try:
+                if item is None:
+                    return
+
+                func, args = item
+                try:
+                    func(*args)
+                except Exception:
+                    pass
+            finally:
+                work_queue.task_done()
+
+    def flush(self):
+        """
+        Blocks until the pending spans are finished.
+        """
+        if self._pid == os.getpid():
+            self._queue.join()
+
+    def close(self, timeout=None):
+        """
+        Finishes the pending spans and stops the worker thread.
+        """
+        with self._lock:
+            if self._pid != os.getpid():
+                return
+
+            self._pid = None
+
+        self._queue.put(None)
+        self._thread.join(timeout)
@@ -3,6 +3,7 @@ import unittest
 
 from opentracing.mocktracer import MockTracer
 import redis
+import redis.cluster
 import redis_opentracing
 from redis_opentracing import tracing
 
@@ -13,10 +14,24 @@ class TestGlobalCalls(unittest.TestCase):
         # after-test restoration.
         self._execute_command = redis.StrictRedis.execute_command
         self._pipeline = redis.StrictRedis.pipeline
+        self._methods = {
+            klass: dict(vars(klass)) for klass in (
+                redis.StrictRedis,
+                redis.cluster.RedisCluster,
+                redis.ConnectionPool,
+                redis.BlockingConnectionPool,
+            )
+        }
 
     def tearDown(self):
         redis.StrictRedis.execute_command = self._execute_command
         redis.StrictRedis.pipeline = self._pipeline
+        for klass, methods in self._methods.items():
+            for name, method in methods.items():
+                if vars(klass).get(name) is not method:
+                    setattr(klass, name, method)
+            for name in set(vars(klass)) - set(methods):
+                delattr(klass, name)
         tracing._reset_tracing()
 
     def test_init(self):
@@ -0,0 +1,197 @@
+from opentracing.mocktracer import MockTracer
+from mock import patch
+import unittest
+
+import redis
+import redis_opentracing
+from redis_opentracing import tracing
+
+
+class TestRedisCommand(unittest.TestCase):
+    def test_command(self):
+        command = redis_opentracing.RedisCommand((b'get', 'my.key'))
+        self.assertEqual(command.name, 'GET')
+        self.assertEqual(command.keys, ['my.key'])
+        self.assertEqual(command.args, (b'get', 'my.key'))
+        self.assertFalse(command.is_pipeline)
+        self.assertEqual(command.stack, None)
+
+    def test_keys(self):
+        def keys(*args):
+            return redis_opentracing.RedisCommand(args).keys
+
+        self.assertEqual(keys('SET', 'a', '1', 'EX', 10), ['a'])
+        self.assertEqual(keys('MGET', 'a', 'b'), ['a', 'b'])
+        self.assertEqual(keys('MSET', 'a', '1', 'b', '2'), ['a', 'b'])
+        self.assertEqual(keys('EVALSHA', 'sha', 2, 'a', 'b', 'arg'),
+                         ['a', 'b'])
+        self.assertEqual(keys('PING'), [])
+        self.assertEqual(keys('CONFIG SET', 'maxmemory', '1mb'), [])
+        self.assertEqual(keys('OBJECT', 'ENCODING', 'a'), ['a'])
+        self.assertEqual(keys('OBJECT ENCODING', 'a'), ['a'])
+
+    def test_pipeline(self):
+        command_stack = [
+            (('SET', 'a', '1'), {}),
+            (('MGET', 'a', 'b'), {}),
+        ]
+        command = redis_opentracing.RedisCommand(('MULTI',), command_stack,
+                                                 True)
+        self.assertTrue(command.is_pipeline)
+        self.assertTrue(command.transaction)
+        self.assertEqual(command.name, 'MULTI')
+        self.assertEqual([c.name for c in command.stack], ['SET', 'MGET'])
+        self.assertEqual(command.keys, ['a', 'b'])
+
+    def test_result_size(self):
+        command = redis_opentracing.RedisCommand(('GET', 'a'))
+        self.assertEqual(command.result_size, 0)
+        command.result = b'abc'
+        self.assertEqual(command.result_size, 3)
+        command.result = [1, 2]
+        self.assertEqual(command.result_size, 2)
+        command.result = 42
+        self.assertEqual(command.result_size, 1)
+
+
+class TestCommandCallbacks(unittest.TestCase):
+    def setUp(self):
+        self.tracer = MockTracer()
+        self.client = redis.StrictRedis()
+
+    def tearDown(self):
+        tracing._reset_tracing()
+
+    def test_start_span_cb_command(self):
+        commands = []
+
+        def start_span_cb(span, command):
+            commands.append(command)
+            span.set_tag('redis.key', command.keys[0])
+
+        with patch.object(self.client, 'execute_command',
+                          return_value='1') as exc_command:
+            exc_command.__name__ = 'execute_command'
+
+            redis_opentracing.init_tracing(self.tracer,
+                                           trace_all_classes=False,
+                                           start_span_cb=start_span_cb,
+                                           start_span_cb_command=True)
+            redis_opentracing.trace_client(self.client)
+            self.client.get('my.key')
+
+        self.assertEqual(commands[0].name, 'GET')
+        span = self.tracer.finished_spans()[0]
+        self.assertEqual(span.tags['redis.key'], 'my.key')
+
+    def test_start_span_cb_no_command(self):
+        prefixes = []
+
+        def start_span_cb(span, prefix='x'):
+            prefixes.append(prefix)
+
+        with patch.object(self.client, 'execute_command',
+                          return_value='1') as exc_command:
+            exc_command.__name__ = 'execute_command'
+
+            redis_opentracing.init_tracing(self.tracer,
+                                           trace_all_classes=False,
+                                           start_span_cb=start_span_cb)
+            redis_opentracing.trace_client(self.client)
+            self.client.get('my.key')
+
+        self.assertEqual(prefixes, ['x'])
+
+    def test_finish_span_cb(self):
+        commands = []
+
+        def finish_span_cb(span, command):
+            commands.append(command)
+            if command.duration < 1.0:
+                span.set_tag('sampling.priority', 0)
+
+        with patch.object(self.client, 'execute_command',
+                          return_value=b'value') as exc_command:
+            exc_command.__name__ = 'execute_command'
+
+            redis_opentracing.init_tracing(self.tracer,
+                                           trace_all_classes=False,
+                                           finish_span_cb=finish_span_cb)
+            redis_opentracing.trace_client(self.client)
+            self.client.get('my.key')
+
+        command = commands[0]
+        self.assertEqual(command.name, 'GET')
+        self.assertEqual(command.result, b'value')
+        self.assertEqual(command.result_size, 5)
+        self.assertEqual(command.exception, None)
+        self.assertTrue(command.duration >= 0)
+
+        span = self.tracer.finished_spans()[0]
+        self.assertEqual(span.tags['sampling.priority'], 0)
+
+    def test_finish_span_cb_error(self):
+        commands = []
+
+        def finish_span_cb(span, command):
+            commands.append(command)
+            raise RuntimeError('This should not happen')
+
+        with patch.object(self.client, 'execute_command',
+                          side_effect=ValueError) as exc_command:
+            exc_command.__name__ = 'execute_command'
+
+            redis_opentracing.init_tracing(self.tracer,
+                                           trace_all_classes=False,
+                                           finish_span_cb=finish_span_cb)
+            redis_opentracing.trace_client(self.client)
+            with self.assertRaises(ValueError):
+                self.client.get('my.key')
+
+        self.assertTrue(isinstance(commands[0].exception, ValueError))
+        self.assertEqual(len(self.tracer.finished_spans()), 1)
+
+    def test_finish_span_cb_pipeline(self):
+        commands = []
+
+        def finish_span_cb(span, command):
+            commands.append(command)
+
+        pipe = self.client.pipeline()
+        with patch.object(pipe, 'execute',
+                          return_value=[1, True]) as execute:
+            execute.__name__ = 'execute'
+
+            redis_opentracing.init_tracing(self.tracer,
+                                           trace_all_classes=False,
+                                           finish_span_cb=finish_span_cb)
+            redis_opentracing.trace_pipeline(pipe)
+            pipe.lpush('my:keys', 1, 3)
+            pipe.set('my.key', 1)
+            pipe.execute()
+
+        command = commands[0]
+        self.assertTrue(command.is_pipeline)
+        self.assertEqual([c.name for c in command.stack], ['LPUSH', 'SET'])
+        self.assertEqual(command.keys, ['my:keys', 'my.key'])
+        self.assertEqual(command.result, [1, True])
+
+    def test_no_command(self):
+        with patch.object(tracing, 'RedisCommand') as command_class:
+            with patch.object(self.client, 'execute_command',
+                              return_value='1') as exc_command:
+                exc_command.__name__ = 'execute_command'
+
+                redis_opentracing.init_tracing(
+                    self.tracer,
+                    trace_all_classes=False,
+                    start_span_cb=lambda span: None,
+                )
+                redis_opentracing.trace_client(self.client)
+                self.client.get('my.key')
+
+        self.assertEqual(command_class.call_count, 0)
+
+    def test_init_finish_span_cb_invalid(self):
+        with self.assertRaises(ValueError):
+            redis_opentracing.init_tracing(finish_span_cb=1)
@@ -0,0 +1,144 @@
+from opentracing.mocktracer import MockTracer
+from mock import Mock, patch
+import unittest
+
+import redis
+import redis_opentracing
+from redis_opentracing import flight_recorder, tracing
+from redis_opentracing.flight_recorder import STATUS_ERROR, STATUS_OK
+
+
+class TestFlightRecorder(unittest.TestCase):
+    def setUp(self):
+        self.tracer = MockTracer()
+        self.client = redis.StrictRedis()
+        self.recorder = redis_opentracing.FlightRecorder(size=3)
+
+    def tearDown(self):
+        tracing._reset_tracing()
+
+    def test_record(self):
+        self.recorder.record('GET', 'my.key', 10.0, 0.5, STATUS_OK)
+        self.recorder.record('SET', None, 11.0, 0.25, STATUS_ERROR)
+
+        self.assertEqual(self.recorder.dump(), [{
+            'timestamp': 10.0,
+            'duration': 0.5,
+            'command': 'GET',
+            'key_hash': hash('my.key') & 0xFFFFFFFF,
+            'status': 'ok',
+        }, {
+            'timestamp': 11.0,
+            'duration': 0.25,
+            'command': 'SET',
+            'key_hash': 0,
+            'status': 'error',
+        }])
+
+    def test_record_wraps(self):
+        for i in range(5):
+            self.recorder.record('GET', None, float(i), 0.0, STATUS_OK)
+
+        records = self.recorder.dump()
+        self.assertEqual([r['timestamp'] for r in records], [2.0, 3.0, 4.0])
+
+    def test_record_commands_exhausted(self):
+        with patch.object(flight_recorder, '_MAX_COMMAND_ID', 2):
+            for command in ('GET', 'SET', 'DEL', 'GET'):
+                self.recorder.record(command, None, 0.0, 0.0, STATUS_OK)
+
+        records = self.recorder.dump()
+        self.assertEqual([r['command'] for r in records],
+                         ['SET', '(other)', 'GET'])
+
+    def test_invalid_size(self):
+        with self.assertRaises(ValueError):
+            redis_opentracing.FlightRecorder(size=0)
+
+    def test_write(self):
+        self.recorder.record('GET', None, 10.0, 0.5, STATUS_OK)
+        stream = Mock()
+        self.recorder.write(stream)
+        stream.write.assert_called_once_with(
+            '10.000000 0.500000 GET 00000000 ok\n'
+        )
+
+    def test_trace_client_no_spans(self):
+        with patch.object(self.client,
+                          'execute_command',
+                          return_value='1') as exc_command:
+            exc_command.__name__ = 'execute_command'
+
+            redis_opentracing.init_tracing(self.tracer,
+                                           trace_all_classes=False,
+                                           flight_recorder=self.recorder,
+                                           trace_spans=False)
+            redis_opentracing.trace_client(self.client)
+            res = self.client.get('my.key')
+
+            self.assertEqual(res, '1')
+            self.assertEqual(len(self.tracer.finished_spans()), 0)
+
+        records = self.recorder.dump()
+        self.assertEqual(len(records), 1)
+        self.assertEqual(records[0]['command'], 'GET')
+        self.assertEqual(records[0]['key_hash'],
+                         hash('my.key') & 0xFFFFFFFF)
+        self.assertEqual(records[0]['status'], 'ok')
+
+    def test_trace_client_error(self):
+        with patch.object(self.client,
+                          'execute_command',
+                          side_effect=ValueError) as exc_command:
+            exc_command.__name__ = 'execute_command'
+
+            redis_opentracing.init_tracing(self.tracer,
+                                           trace_all_classes=False,
+                                           flight_recorder=self.recorder)
+            redis_opentracing.trace_client(self.client)
+            with self.assertRaises(ValueError):
+                self.client.get('my.key')
+
+            self.assertEqual(len(self.tracer.finished_spans()), 1)
+
+        records = self.recorder.dump()
+        self.assertEqual(records[0]['status'], 'error')
+
+    def test_trace_pipeline(self):
+        pipe = self.client.pipeline()
+        with patch.object(pipe, 'execute') as execute:
+            execute.__name__ = 'execute'
+
+            redis_opentracing.init_tracing(self.tracer,
+                                           trace_all_classes=False,
+                                           flight_recorder=self.recorder,
+                                           trace_spans=False)
+            redis_opentracing.trace_pipeline(pipe)
+            pipe.lpush('my:keys', 1, 3)
+            pipe.execute()
+
+            self.assertEqual(execute.call_count, 1)
+            self.assertEqual(len(self.tracer.finished_spans()), 0)
+
+        records = self.recorder.dump()
+        self.assertEqual(records[0]['command'], 'MULTI')
+
+    def test_trace_client_keys(self):
+        with patch.object(self.client,
+                          'execute_command',
+                          return_value='1') as exc_command:
+            exc_command.__name__ = 'execute_command'
+
+            redis_opentracing.init_tracing(self.tracer,
+                                           trace_all_classes=False,
+                                           flight_recorder=self.recorder,
+                                           trace_spans=False)
+            redis_opentracing.trace_client(self.client)
+            self.client.eval("return redis.call('GET', KEYS[1])", 1,
+                             'user:1')
+            self.client.execute_command('SELECT', 3)
+
+        records = self.recorder.dump()
+        self.assertEqual(records[0]['key_hash'],
+                         hash('user:1') & 0xFFFFFFFF)
+        self.assertEqual(records[1]['key_hash'], 0)
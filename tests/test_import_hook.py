@@ -0,0 +1,77 @@
+import os
+import importlib
+import shutil
+import subprocess
+import sys
+import tempfile
+import unittest
+
+from redis_opentracing import import_hook
+
+
+class TestImportHook(unittest.TestCase):
+    def setUp(self):
+        self.path = tempfile.mkdtemp()
+        sys.path.insert(0, self.path)
+
+    def tearDown(self):
+        import_hook._remove_hooks()
+        sys.path.remove(self.path)
+        shutil.rmtree(self.path)
+        sys.modules.pop('ot_hooked_module', None)
+
+    def test_when_imported(self):
+        with open(os.path.join(self.path, 'ot_hooked_module.py'), 'w') as f:
+            f.write('VALUE = 1\n')
+
+        imported = []
+        import_hook.when_imported('ot_hooked_module', imported.append)
+        self.assertEqual(imported, [])
+
+        import ot_hooked_module
+        self.assertEqual(imported, [ot_hooked_module])
+        self.assertEqual(ot_hooked_module.VALUE, 1)
+
+    def test_when_imported_already(self):
+        imported = []
+        import_hook.when_imported('os', imported.append)
+        self.assertEqual(imported, [os])
+
+    def test_when_imported_reload(self):
+        if import_hook.find_spec is None:
+            self.skipTest('Reloads are covered only with PEP 451')
+
+        with open(os.path.join(self.path, 'ot_hooked_module.py'), 'w') as f:
+            f.write('VALUE = 1\n')
+
+        imported = []
+        import_hook.when_imported('ot_hooked_module', imported.append)
+
+        import ot_hooked_module
+        importlib.reload(ot_hooked_module)
+        importlib.reload(ot_hooked_module)
+        self.assertEqual(imported, [ot_hooked_module] * 3)
+
+    def test_deferred_patching(self):
+        if import_hook.find_spec is None:
+            self.skipTest('Deferred patching requires PEP 451')
+
+        # Run in a new interpreter, so redis has not been imported yet.
+        code = '\n'.join([
+            'import sys',
+            'import redis_opentracing',
+            'redis_opentracing.init_tracing(deferred_patching=True)',
+            'assert "redis" not in sys.modules',
+            'import redis',
+            'assert hasattr(redis.StrictRedis.execute_command,'
+            ' "__wrapped__")',
+            'assert hasattr(redis.ConnectionPool.get_connection,'
+            ' "__wrapped__")',
+            'import importlib',
+            'importlib.reload(redis.client)',
+            'assert hasattr(redis.client.StrictRedis.execute_command,'
+            ' "__wrapped__")',
+            'assert not hasattr(redis.client.StrictRedis.execute_command'
+            '.__wrapped__, "__wrapped__")',
+        ])
+        subprocess.check_call([sys.executable, '-c', code])
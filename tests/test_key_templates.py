@@ -0,0 +1,137 @@
+from opentracing.mocktracer import MockTracer
+from mock import patch
+import unittest
+
+import redis
+import redis_opentracing
+from redis_opentracing import tracing
+
+
+class TestKeyNormalizer(unittest.TestCase):
+    def test_normalize(self):
+        normalizer = redis_opentracing.KeyNormalizer()
+        self.assertEqual(normalizer('user:123456:profile'),
+                         'user:{id}:profile')
+        self.assertEqual(normalizer(b'user:123456:profile'),
+                         'user:{id}:profile')
+        self.assertEqual(
+            normalizer('session:3f2b9c1e-8d4a-4b7e-9f0a-1c2d3e4f5a6b'),
+            'session:{uuid}'
+        )
+        self.assertEqual(normalizer('cache/0123456789abcdef0123/v2'),
+                         'cache/{hash}/v2')
+        self.assertEqual(normalizer('last_access'), 'last_access')
+        self.assertEqual(normalizer(42), '{id}')
+
+    def test_custom_rules(self):
+        normalizer = redis_opentracing.KeyNormalizer(
+            delimiters='|',
+            rules=[(r'[a-z]+@[a-z.]+', '{email}')],
+        )
+        self.assertEqual(normalizer('user|foo@example.com|12'),
+                         'user|{email}|12')
+
+    def test_cache(self):
+        normalizer = redis_opentracing.KeyNormalizer(cache_size=2)
+        with patch.object(normalizer, '_normalize',
+                          wraps=normalizer._normalize) as normalize:
+            normalizer('user:1')
+            normalizer('user:1')
+            self.assertEqual(normalize.call_count, 1)
+
+            normalizer('user:2')
+            normalizer('user:1')
+            normalizer('user:3')
+            self.assertEqual(normalize.call_count, 3)
+            self.assertEqual(list(normalizer._cache), ['user:1', 'user:3'])
+
+
+class TestKeyTemplates(unittest.TestCase):
+    def setUp(self):
+        self.tracer = MockTracer()
+        self.client = redis.StrictRedis()
+
+    def tearDown(self):
+        tracing._reset_tracing()
+
+    def test_trace_client_key_template(self):
+        with patch.object(self.client,
+                          'execute_command',
+                          return_value='1') as exc_command:
+            exc_command.__name__ = 'execute_command'
+
+            redis_opentracing.init_tracing(
+                self.tracer,
+                trace_all_classes=False,
+                key_normalizer=redis_opentracing.KeyNormalizer(),
+            )
+            redis_opentracing.trace_client(self.client)
+            self.client.get('user:123456:profile')
+
+        span = self.tracer.finished_spans()[0]
+        self.assertEqual(span.operation_name, 'GET')
+        self.assertEqual(span.tags['redis.key_template'],
+                         'user:{id}:profile')
+
+    def test_trace_client_key_template_operation_name(self):
+        with patch.object(self.client,
+                          'execute_command',
+                          return_value='1') as exc_command:
+            exc_command.__name__ = 'execute_command'
+
+            redis_opentracing.init_tracing(
+                self.tracer,
+                trace_all_classes=False,
+                key_normalizer=redis_opentracing.KeyNormalizer(),
+                key_template_in_operation_name=True,
+            )
+            redis_opentracing.trace_client(self.client)
+            self.client.get('user:123456:profile')
+            self.client.ping()
+
+        spans = self.tracer.finished_spans()
+        self.assertEqual(spans[0].operation_name, 'GET user:{id}:profile')
+        self.assertEqual(spans[1].operation_name, 'PING')
+        self.assertFalse('redis.key_template' in spans[1].tags)
+
+    def test_trace_client_key_template_eval(self):
+        with patch.object(self.client,
+                          'execute_command',
+                          return_value='1') as exc_command:
+            exc_command.__name__ = 'execute_command'
+
+            redis_opentracing.init_tracing(
+                self.tracer,
+                trace_all_classes=False,
+                key_normalizer=redis_opentracing.KeyNormalizer(),
+                key_template_in_operation_name=True,
+            )
+            redis_opentracing.trace_client(self.client)
+            self.client.eval("return redis.call('GET', KEYS[1])", 1,
+                             'user:1')
+
+        span = self.tracer.finished_spans()[0]
+        self.assertEqual(span.operation_name, 'EVAL user:{id}')
+        self.assertEqual(span.tags['redis.key_template'], 'user:{id}')
+
+    def test_trace_client_key_template_no_keys(self):
+        with patch.object(self.client,
+                          'execute_command',
+                          return_value='1') as exc_command:
+            exc_command.__name__ = 'execute_command'
+
+            redis_opentracing.init_tracing(
+                self.tracer,
+                trace_all_classes=False,
+                key_normalizer=redis_opentracing.KeyNormalizer(),
+                key_template_in_operation_name=True,
+            )
+            redis_opentracing.trace_client(self.client)
+            self.client.execute_command('SELECT', 3)
+            self.client.config_set('maxmemory', '100mb')
+
+        spans = self.tracer.finished_spans()
+        self.assertEqual([span.operation_name for span in spans],
+                         ['SELECT', 'CONFIG SET'])
+        for span in spans:
+            self.assertFalse('redis.key_template' in span.tags)
@@ -0,0 +1,117 @@
+from opentracing.mocktracer import MockTracer
+from mock import patch
+import unittest
+
+import redis
+import redis_opentracing
+from redis_opentracing import tracing
+
+
+class TestNPlusOne(unittest.TestCase):
+    def setUp(self):
+        self.tracer = MockTracer()
+        self.client = redis.StrictRedis()
+
+    def tearDown(self):
+        tracing._reset_tracing()
+
+    def _trace_client(self, threshold):
+        redis_opentracing.init_tracing(self.tracer,
+                                       trace_all_classes=False,
+                                       n_plus_one_threshold=threshold)
+        redis_opentracing.trace_client(self.client)
+
+    def test_init_invalid_threshold(self):
+        with self.assertRaises(ValueError):
+            redis_opentracing.init_tracing(self.tracer,
+                                           trace_all_classes=False,
+                                           n_plus_one_threshold=1)
+
+    def test_n_plus_one(self):
+        with patch.object(self.client, 'execute_command',
+                          return_value='1') as exc_command:
+            exc_command.__name__ = 'execute_command'
+            self._trace_client(3)
+
+            with self.tracer.start_active_span('request'):
+                for i in range(5):
+                    self.client.get('user:%d' % i)
+
+        parent = self.tracer.finished_spans()[-1]
+        self.assertEqual(parent.operation_name, 'request')
+        self.assertTrue(parent.tags['redis.n_plus_one'])
+        self.assertEqual(parent.tags['redis.n_plus_one.command'], 'GET')
+        self.assertEqual(parent.tags['redis.n_plus_one.count'], 5)
+        self.assertTrue(parent.tags['redis.n_plus_one.total_time_ms'] >= 0)
+        self.assertEqual(len(parent.logs), 1)
+        self.assertEqual(parent.logs[0].key_values, {
+            'event': 'redis.n_plus_one',
+            'command': 'GET',
+            'threshold': 3,
+        })
+
+    def test_n_plus_one_below_threshold(self):
+        with patch.object(self.client, 'execute_command',
+                          return_value='1') as exc_command:
+            exc_command.__name__ = 'execute_command'
+            self._trace_client(3)
+
+            with self.tracer.start_active_span('request'):
+                self.client.get('user:1')
+                self.client.get('user:2')
+                self.client.set('user:3', 1)
+                self.client.get('user:4')
+
+        parent = self.tracer.finished_spans()[-1]
+        self.assertFalse('redis.n_plus_one' in parent.tags)
+        self.assertEqual(len(parent.logs), 0)
+
+    def test_n_plus_one_longest_streak(self):
+        with patch.object(self.client, 'execute_command',
+                          return_value='1') as exc_command:
+            exc_command.__name__ = 'execute_command'
+            self._trace_client(2)
+
+            with self.tracer.start_active_span('request'):
+                for i in range(3):
+                    self.client.get('user:%d' % i)
+                for i in range(2):
+                    self.client.set('user:%d' % i, 1)
+
+        parent = self.tracer.finished_spans()[-1]
+        self.assertEqual(parent.tags['redis.n_plus_one.command'], 'GET')
+        self.assertEqual(parent.tags['redis.n_plus_one.count'], 3)
+        self.assertEqual([log.key_values['command'] for log in parent.logs],
+                         ['GET', 'SET'])
+
+    def test_n_plus_one_no_parent(self):
+        with patch.object(self.client, 'execute_command',
+                          return_value='1') as exc_command:
+            exc_command.__name__ = 'execute_command'
+            self._trace_client(2)
+
+            for i in range(3):
+                self.client.get('user:%d' % i)
+
+        for span in self.tracer.finished_spans():
+            self.assertFalse('redis.n_plus_one' in span.tags)
+
+    def test_n_plus_one_pipeline(self):
+        with patch.object(self.client, 'execute_command',
+                          return_value='1') as exc_command:
+            exc_command.__name__ = 'execute_command'
+            self._trace_client(2)
+
+            pipe = self.client.pipeline()
+            with self.tracer.start_active_span('request'):
+                with patch.object(pipe, 'execute') as execute:
+                    execute.__name__ = 'execute'
+                    redis_opentracing.trace_pipeline(pipe)
+
+                    self.client.get('user:1')
+                    pipe.get('user:2')
+                    pipe.execute()
+                    self.client.get('user:3')
+
+        parent = self.tracer.finished_spans()[-1]
+        self.assertFalse('redis.n_plus_one' in parent.tags)
@@ -0,0 +1,100 @@
+from opentracing.mocktracer import MockTracer
+from mock import patch
+import time
+import unittest
+
+import redis
+import redis_opentracing
+from redis_opentracing import tracing
+
+
+class TestOverhead(unittest.TestCase):
+    def setUp(self):
+        self.tracer = MockTracer()
+        self.client = redis.StrictRedis()
+
+    def tearDown(self):
+        tracing._reset_tracing()
+
+    def _slow_command(self, *args, **kwargs):
+        time.sleep(0.05)
+        return '1'
+
+    def test_overhead(self):
+        def start_span_cb(span):
+            time.sleep(0.01)
+
+        with patch.object(self.client, 'execute_command',
+                          side_effect=self._slow_command) as exc_command:
+            exc_command.__name__ = 'execute_command'
+
+            redis_opentracing.init_tracing(self.tracer,
+                                           trace_all_classes=False,
+                                           start_span_cb=start_span_cb,
+                                           measure_overhead=True)
+            redis_opentracing.trace_client(self.client)
+            self.client.get('my.key')
+            self.client.get('my.key')
+
+        stats = redis_opentracing.get_overhead_stats()
+        self.assertEqual(stats['count'], 2)
+        self.assertTrue(stats['callback'] >= 0.02)
+
+        # The Redis calls are left out.
+        self.assertTrue(stats['total'] < 0.1)
+        self.assertAlmostEqual(stats['total'],
+                               stats['start'] + stats['format'] +
+                               stats['callback'] + stats['finish'])
+        self.assertAlmostEqual(stats['mean'], stats['total'] / 2)
+        self.assertTrue(stats['max'] >= stats['mean'])
+
+        for span in self.tracer.finished_spans():
+            self.assertFalse('redis.tracing.overhead_ms' in span.tags)
+
+    def test_overhead_error(self):
+        with patch.object(self.client, 'execute_command',
+                          side_effect=ValueError) as exc_command:
+            exc_command.__name__ = 'execute_command'
+
+            redis_opentracing.init_tracing(self.tracer,
+                                           trace_all_classes=False,
+                                           measure_overhead=True)
+            redis_opentracing.trace_client(self.client)
+            with self.assertRaises(ValueError):
+                self.client.get('my.key')
+
+        self.assertEqual(redis_opentracing.get_overhead_stats()['count'], 1)
+
+    def test_overhead_pipeline(self):
+        pipe = self.client.pipeline()
+        with patch.object(pipe, 'execute',
+                          side_effect=self._slow_command) as execute:
+            execute.__name__ = 'execute'
+
+            redis_opentracing.init_tracing(self.tracer,
+                                           trace_all_classes=False,
+                                           overhead_tag=True)
+            redis_opentracing.trace_pipeline(pipe)
+            pipe.lpush('my:keys', 1, 3)
+            pipe.execute()
+
+        stats = redis_opentracing.get_overhead_stats()
+        self.assertEqual(stats['count'], 1)
+        self.assertTrue(stats['total'] < 0.05)
+
+        span = self.tracer.finished_spans()[0]
+        self.assertTrue(0 <= span.tags['redis.tracing.overhead_ms'] < 50)
+
+    def test_overhead_disabled(self):
+        with patch.object(self.client, 'execute_command',
+                          return_value='1') as exc_command:
+            exc_command.__name__ = 'execute_command'
+
+            redis_opentracing.init_tracing(self.tracer,
+                                           trace_all_classes=False)
+            redis_opentracing.trace_client(self.client)
+            self.client.get('my.key')
+
+        self.assertEqual(redis_opentracing.get_overhead_stats()['count'], 0)
+        span = self.tracer.finished_spans()[0]
+        self.assertFalse('redis.tracing.overhead_ms' in span.tags)
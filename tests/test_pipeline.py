@@ -121,3 +121,43 @@ class TestPipeline(unittest.TestCase):
             self.assertTrue(isinstance(
                 span.logs[0].key_values.get('error.object', None), ValueError
             ))
+
+    def test_trace_pipeline_immediate_error(self):
+        pipe = self.client.pipeline()
+        with patch.object(pipe, 'immediate_execute_command',
+                          side_effect=ValueError) as iexecute:
+            iexecute.__name__ = 'immediate_execute_command'
+            redis_opentracing.init_tracing(self.tracer,
+                                           trace_all_classes=False)
+
+            redis_opentracing.trace_pipeline(pipe)
+            with self.assertRaises(ValueError):
+                pipe.immediate_execute_command('WATCH', 'my:key')
+
+            self.assertEqual(len(self.tracer.finished_spans()), 1)
+            span = self.tracer.finished_spans()[0]
+            self.assertTrue(span.tags['error'])
+
+    def test_trace_pipeline_watch_error(self):
+        pipe = self.client.pipeline()
+        with patch.object(pipe, 'execute',
+                          side_effect=redis.WatchError) as execute:
+            execute.__name__ = 'execute'
+
+            redis_opentracing.init_tracing(self.tracer,
+                                           trace_all_classes=False)
+            redis_opentracing.trace_pipeline(pipe)
+            pipe.lpush('my:keys', 1, 3)
+
+            with self.assertRaises(redis.WatchError):
+                pipe.execute()
+
+            span = self.tracer.finished_spans()[0]
+            self.assertEqual(span.tags, {
+                'component': 'redis-py',
+                'db.type': 'redis',
+                'db.statement': 'LPUSH my:keys 1 3',
+                'span.kind': 'client',
+                'redis.contention': True,
+            })
+            self.assertEqual(span.logs[0].key_values, {'event': 'contention'})
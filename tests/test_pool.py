@@ -0,0 +1,135 @@
+from opentracing.mocktracer import MockTracer
+from mock import patch
+import unittest
+
+import redis
+import redis_opentracing
+from redis_opentracing import tracing
+
+
+class DummyConnection(object):
+    def __init__(self, **kwargs):
+        self.pid = None
+
+    def connect(self):
+        pass
+
+    def can_read(self):
+        return False
+
+    def disconnect(self):
+        pass
+
+
+class FailingConnection(DummyConnection):
+    def connect(self):
+        raise redis.ConnectionError('Connection refused')
+
+
+class TestPool(unittest.TestCase):
+    def setUp(self):
+        self.tracer = MockTracer()
+        self.pool = redis.BlockingConnectionPool(
+            connection_class=DummyConnection,
+            max_connections=2,
+        )
+
+    def tearDown(self):
+        tracing._reset_tracing()
+
+    def test_trace_pool_stats(self):
+        redis_opentracing.init_tracing(self.tracer,
+                                       trace_all_classes=False)
+        redis_opentracing.trace_connection_pool(self.pool)
+
+        conn1 = self.pool.get_connection()
+        conn2 = self.pool.get_connection()
+        stats = redis_opentracing.get_pool_stats(self.pool)
+        self.assertEqual(stats['in_use'], 2)
+        self.assertEqual(stats['idle'], 0)
+        self.assertEqual(stats['waiters'], 0)
+        self.assertEqual(stats['max'], 2)
+        self.assertEqual(stats['checkouts'], 2)
+
+        self.pool.release(conn1)
+        self.pool.release(conn2)
+        stats = redis_opentracing.get_pool_stats(self.pool)
+        self.assertEqual(stats['in_use'], 0)
+        self.assertEqual(stats['idle'], 2)
+
+    def test_trace_pool_wait_time_tag(self):
+        redis_opentracing.init_tracing(self.tracer,
+                                       trace_all_classes=False)
+        redis_opentracing.trace_connection_pool(self.pool)
+
+        with self.tracer.start_active_span('GET'):
+            conn = self.pool.get_connection()
+            self.pool.release(conn)
+
+        span = self.tracer.finished_spans()[0]
+        self.assertTrue('redis.pool.wait_time_ms' in span.tags)
+        self.assertTrue(span.tags['redis.pool.wait_time_ms'] >= 0)
+
+    def test_trace_pool_exhausted(self):
+        self.pool.timeout = 0.01
+        redis_opentracing.init_tracing(self.tracer,
+                                       trace_all_classes=False)
+        redis_opentracing.trace_connection_pool(self.pool)
+
+        self.pool.get_connection()
+        self.pool.get_connection()
+        with self.assertRaises(redis.ConnectionError):
+            self.pool.get_connection()
+
+        stats = redis_opentracing.get_pool_stats(self.pool)
+        self.assertEqual(stats['in_use'], 2)
+        self.assertEqual(stats['waiters'], 0)
+        self.assertEqual(stats['checkouts'], 2)
+
+    def test_trace_pool_reset(self):
+        redis_opentracing.init_tracing(self.tracer,
+                                       trace_all_classes=False)
+        redis_opentracing.trace_connection_pool(self.pool)
+
+        self.pool.get_connection()
+        self.pool.reset()
+
+        stats = redis_opentracing.get_pool_stats(self.pool)
+        self.assertEqual(stats['in_use'], 0)
+        self.assertEqual(stats['idle'], 0)
+
+    def test_trace_pool_connect_error(self):
+        pool = redis.BlockingConnectionPool(
+            connection_class=DummyConnection,
+            max_connections=3,
+        )
+        redis_opentracing.init_tracing(self.tracer,
+                                       trace_all_classes=False)
+        redis_opentracing.trace_connection_pool(pool)
+
+        pool.get_connection()
+        pool.get_connection()
+        pool.connection_class = FailingConnection
+        with patch.object(pool, 'release', wraps=pool.release) as release:
+            with self.assertRaises(redis.ConnectionError):
+                pool.get_connection()
+
+            # The pool released the failed connection itself.
+            self.assertEqual(release.call_count, 1)
+
+        stats = redis_opentracing.get_pool_stats(pool)
+        self.assertEqual(stats['in_use'], 2)
+        self.assertEqual(stats['checkouts'], 2)
+
+    def test_trace_pool_release_after_reset(self):
+        redis_opentracing.init_tracing(self.tracer,
+                                       trace_all_classes=False)
+        redis_opentracing.trace_connection_pool(self.pool)
+
+        conn = self.pool.get_connection()
+        self.pool.reset()
+        self.pool.get_connection()
+        self.pool.release(conn)
+
+        stats = redis_opentracing.get_pool_stats(self.pool)
+        self.assertEqual(stats['in_use'], 1)
@@ -0,0 +1,139 @@
+from opentracing.mocktracer import MockTracer
+from mock import Mock, patch
+import os
+import shutil
+import tempfile
+import unittest
+
+import redis
+import redis_opentracing
+from redis_opentracing import tracing
+from redis_opentracing.replay import _COMMAND, _RECORD, read_records, replay
+
+
+class TestReplay(unittest.TestCase):
+    def setUp(self):
+        self.tracer = MockTracer()
+        self.client = redis.StrictRedis()
+        self.dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.dir, 'commands.bin')
+
+    def tearDown(self):
+        tracing._reset_tracing()
+        shutil.rmtree(self.dir)
+
+    def test_record(self):
+        recorder = redis_opentracing.CommandRecorder(self.path)
+        start_time = recorder._start_time
+        recorder.record_command(start_time + 0.5, ('SET', u'k\xe9y', 1.5))
+        recorder.record_pipeline(start_time + 1.0,
+                                 [('GET', 'a'), ('GET', 'b')], True)
+        recorder.close()
+
+        self.assertEqual(list(read_records(self.path)), [
+            (0.5, [[b'SET', u'k\xe9y'.encode('utf-8'), b'1.5']], None),
+            (1.0, [[b'GET', b'a'], [b'GET', b'b']], True),
+        ])
+
+    def test_record_sizes_only(self):
+        recorder = redis_opentracing.CommandRecorder(self.path,
+                                                     sizes_only=True)
+        recorder.record_command(recorder._start_time, ('SET', 'key', 'abc'))
+        recorder.close()
+
+        self.assertEqual(list(read_records(self.path)), [
+            (0.0, [[b'SET', b'xxx', b'xxx']], None),
+        ])
+
+    def test_invalid_file(self):
+        with open(self.path, 'wb') as f:
+            f.write(b'\0' * 16)
+
+        with self.assertRaises(ValueError):
+            list(read_records(self.path))
+
+    def test_trace_client(self):
+        recorder = redis_opentracing.CommandRecorder(self.path)
+        with patch.object(self.client,
+                          'execute_command',
+                          return_value='1') as exc_command:
+            exc_command.__name__ = 'execute_command'
+
+            redis_opentracing.init_tracing(self.tracer,
+                                           trace_all_classes=False,
+                                           command_recorder=recorder)
+            redis_opentracing.trace_client(self.client)
+            self.client.get('my.key')
+
+            pipe = self.client.pipeline(transaction=False)
+            with patch.object(pipe, 'execute') as execute:
+                execute.__name__ = 'execute'
+                redis_opentracing.trace_pipeline(pipe)
+                pipe.set('a', 1)
+                pipe.incr('b')
+                pipe.execute()
+
+        recorder.close()
+
+        records = list(read_records(self.path))
+        self.assertEqual(len(records), 2)
+        self.assertEqual(records[0][1:], ([[b'GET', b'my.key']], None))
+        self.assertEqual(records[1][1:], (
+            [[b'SET', b'a', b'1'], [b'INCRBY', b'b', b'1']],
+            False,
+        ))
+
+    def test_trace_pubsub(self):
+        recorder = redis_opentracing.CommandRecorder(self.path)
+        pubsub = self.client.pubsub()
+        with patch.object(pubsub, 'execute_command') as exc_command:
+            exc_command.__name__ = 'execute_command'
+
+            redis_opentracing.init_tracing(self.tracer,
+                                           trace_all_classes=False,
+                                           command_recorder=recorder)
+            redis_opentracing.trace_pubsub(pubsub)
+            pubsub.execute_command('SUBSCRIBE', 'channel1')
+            pubsub.execute_command('PING')
+
+        recorder.close()
+
+        records = list(read_records(self.path))
+        self.assertEqual([r[1] for r in records], [[[b'PING']]])
+
+    def test_replay_skip_pubsub(self):
+        recorder = redis_opentracing.CommandRecorder(self.path)
+        # Bypasses the filtering of record_command().
+        recorder._write(_RECORD.pack(_COMMAND, 0) +
+                        recorder._encode_args((b'subscribe', 'channel1')))
+        recorder.record_command(recorder._start_time, ('GET', 'a'))
+        recorder.close()
+
+        client = Mock()
+        stats = replay(self.path, client, speed=None)
+
+        client.execute_command.assert_called_once_with(b'GET', b'a')
+        self.assertEqual(stats['count'], 1)
+
+    def test_replay(self):
+        recorder = redis_opentracing.CommandRecorder(self.path)
+        recorder.record_command(recorder._start_time, ('GET', 'a'))
+        recorder.record_command(recorder._start_time + 0.02, ('GET', 'b'))
+        recorder.record_pipeline(recorder._start_time + 0.04,
+                                 [('GET', 'c')], True)
+        recorder.close()
+
+        client = Mock()
+        client.execute_command.side_effect = [1, ValueError]
+        stats = replay(self.path, client, speed=2.0)
+
+        self.assertEqual(client.execute_command.call_count, 2)
+        client.execute_command.assert_any_call(b'GET', b'a')
+        client.pipeline.assert_called_once_with(True)
+        client.pipeline.return_value.execute_command.assert_called_once_with(
+            b'GET', b'c'
+        )
+        self.assertEqual(stats['count'], 3)
+        self.assertEqual(stats['errors'], 1)
+        self.assertTrue(stats['duration'] >= 0.02)
+        self.assertTrue(stats['max'] >= stats['p50'])
@@ -0,0 +1,95 @@
+from opentracing.mocktracer import MockTracer
+from mock import patch
+import unittest
+
+import redis
+import redis_opentracing
+from redis_opentracing import tracing
+
+
+class TestScan(unittest.TestCase):
+    def setUp(self):
+        self.tracer = MockTracer()
+        self.client = redis.StrictRedis()
+
+    def tearDown(self):
+        tracing._reset_tracing()
+
+    def test_trace_scan_iter(self):
+        pages = [
+            [1, [b'user:1', b'user:2']],
+            [0, [b'user:3']],
+        ]
+        with patch.object(self.client, 'execute_command',
+                          side_effect=pages) as exc_command:
+            exc_command.__name__ = 'execute_command'
+
+            redis_opentracing.init_tracing(self.tracer,
+                                           trace_all_classes=False)
+            redis_opentracing.trace_client(self.client)
+            keys = list(self.client.scan_iter(match='user:*'))
+
+            self.assertEqual(keys, [b'user:1', b'user:2', b'user:3'])
+            self.assertEqual(exc_command.call_count, 2)
+
+        spans = self.tracer.finished_spans()
+        self.assertEqual(len(spans), 1)
+        span = spans[0]
+        self.assertEqual(span.operation_name, 'SCAN_ITER')
+        self.assertEqual(span.tags['db.statement'], 'SCAN MATCH user:*')
+        self.assertEqual(span.tags['redis.scan.match'], 'user:*')
+        self.assertEqual(span.tags['redis.scan.pages'], 2)
+        self.assertEqual(span.tags['redis.scan.items'], 3)
+        self.assertTrue(span.tags['redis.scan.server_time_ms'] >= 0)
+
+    def test_trace_hscan_iter(self):
+        pages = [[0, {b'f1': b'v1', b'f2': b'v2'}]]
+        with patch.object(self.client, 'execute_command',
+                          side_effect=pages) as exc_command:
+            exc_command.__name__ = 'execute_command'
+
+            redis_opentracing.init_tracing(self.tracer,
+                                           trace_all_classes=False)
+            redis_opentracing.trace_client(self.client)
+            items = list(self.client.hscan_iter('my:hash'))
+
+            self.assertEqual(len(items), 2)
+
+        span = self.tracer.finished_spans()[0]
+        self.assertEqual(span.operation_name, 'HSCAN_ITER')
+        self.assertEqual(span.tags['db.statement'], 'HSCAN my:hash')
+        self.assertFalse('redis.scan.match' in span.tags)
+        self.assertEqual(span.tags['redis.scan.pages'], 1)
+        self.assertEqual(span.tags['redis.scan.items'], 2)
+
+    def test_trace_scan_iter_interleaved(self):
+        pages = [[0, [b'user:1', b'user:2']], 1, 1]
+        with patch.object(self.client, 'execute_command',
+                          side_effect=pages) as exc_command:
+            exc_command.__name__ = 'execute_command'
+
+            redis_opentracing.init_tracing(self.tracer,
+                                           trace_all_classes=False)
+            redis_opentracing.trace_client(self.client)
+            for key in self.client.scan_iter():
+                self.client.delete(key)
+
+        # The commands issued while iterating are traced on their own.
+        spans = self.tracer.finished_spans()
+        self.assertEqual([span.operation_name for span in spans],
+                         ['DEL', 'DEL', 'SCAN_ITER'])
+
+    def test_trace_scan_iter_error(self):
+        with patch.object(self.client, 'execute_command',
+                          side_effect=ValueError) as exc_command:
+            exc_command.__name__ = 'execute_command'
+
+            redis_opentracing.init_tracing(self.tracer,
+                                           trace_all_classes=False)
+            redis_opentracing.trace_client(self.client)
+            with self.assertRaises(ValueError):
+                list(self.client.scan_iter())
+
+        span = self.tracer.finished_spans()[0]
+        self.assertTrue(span.tags['error'])
+        self.assertEqual(span.tags['redis.scan.pages'], 1)
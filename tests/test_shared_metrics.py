@@ -0,0 +1,151 @@
+from opentracing.mocktracer import MockTracer
+from mock import Mock, patch
+import os
+import shutil
+import tempfile
+import threading
+import unittest
+
+import redis
+import redis_opentracing
+from redis_opentracing import tracing
+
+
+class TestSharedMetrics(unittest.TestCase):
+    def setUp(self):
+        self.tracer = MockTracer()
+        self.client = redis.StrictRedis()
+        self.dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.dir, 'metrics')
+        self.metrics = redis_opentracing.SharedMetrics(self.path,
+                                                       regions=4,
+                                                       commands=8,
+                                                       buckets=(0.01, 0.1))
+
+    def tearDown(self):
+        tracing._reset_tracing()
+        self.metrics.close()
+        shutil.rmtree(self.dir)
+
+    def test_record(self):
+        self.metrics.record('GET', 0.005)
+        self.metrics.record(b'GET', 0.05, error=True)
+        self.metrics.record('SET', 0.5)
+
+        self.assertEqual(self.metrics.read(), {
+            'GET': {
+                'count': 2,
+                'errors': 1,
+                'total_time': 0.055,
+                'buckets': [(0.01, 1), (0.1, 1), (None, 0)],
+            },
+            'SET': {
+                'count': 1,
+                'errors': 0,
+                'total_time': 0.5,
+                'buckets': [(0.01, 0), (0.1, 0), (None, 1)],
+            },
+        })
+
+    @unittest.skipUnless(hasattr(threading, 'Barrier'), 'Requires Barrier')
+    def test_record_threads(self):
+        barrier = threading.Barrier(8)
+
+        def record():
+            barrier.wait()
+            for _ in range(100):
+                self.metrics.record('GET', 0.005)
+
+        threads = [threading.Thread(target=record) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(self.metrics.read()['GET']['count'], 800)
+        # A single region was claimed.
+        used = [region for region in range(self.metrics.regions)
+                if list(self.metrics._iter_entries(region))]
+        self.assertEqual(used, [0])
+
+    def test_existing_file(self):
+        self.metrics.record('GET', 0.005)
+
+        exporter = redis_opentracing.SharedMetrics(self.path)
+        try:
+            self.assertEqual(exporter.regions, 4)
+            self.assertEqual(exporter.buckets, (0.01, 0.1))
+            self.assertEqual(exporter.read()['GET']['count'], 1)
+        finally:
+            exporter.close()
+
+    def test_invalid_file(self):
+        path = os.path.join(self.dir, 'invalid')
+        with open(path, 'wb') as f:
+            f.write(b'\1' * 64)
+
+        with self.assertRaises(ValueError):
+            redis_opentracing.SharedMetrics(path)
+
+    @unittest.skipUnless(hasattr(os, 'fork'), 'Requires fork()')
+    def test_fork(self):
+        self.metrics.record('GET', 0.005)
+
+        pid = os.fork()
+        if pid == 0:
+            self.metrics.record('GET', 0.005)
+            os._exit(0)
+
+        os.waitpid(pid, 0)
+        self.metrics.record('GET', 0.005)
+        self.assertEqual(self.metrics.read()['GET']['count'], 3)
+
+        # The region of the finished child is taken over.
+        exporter = redis_opentracing.SharedMetrics(self.path)
+        try:
+            exporter.record('GET', 0.005)
+            self.assertEqual(exporter._region, 1)
+            self.assertEqual(exporter.read()['GET']['count'], 4)
+        finally:
+            exporter.close()
+
+    def test_trace_client(self):
+        with patch.object(self.client,
+                          'execute_command',
+                          return_value='1') as exc_command:
+            exc_command.__name__ = 'execute_command'
+
+            redis_opentracing.init_tracing(self.tracer,
+                                           trace_all_classes=False,
+                                           shared_metrics=self.metrics,
+                                           trace_spans=False)
+            redis_opentracing.trace_client(self.client)
+            self.client.get('my.key')
+            self.client.get('my.key')
+
+            self.assertEqual(len(self.tracer.finished_spans()), 0)
+
+        self.assertEqual(self.metrics.read()['GET']['count'], 2)
+
+    def test_trace_client_closed(self):
+        recorder = Mock()
+        recorder.record.side_effect = OSError('No space left on device')
+        self.metrics.close()
+
+        with patch.object(self.client,
+                          'execute_command',
+                          side_effect=[b'1', KeyError]) as exc_command:
+            exc_command.__name__ = 'execute_command'
+
+            redis_opentracing.init_tracing(self.tracer,
+                                           trace_all_classes=False,
+                                           flight_recorder=recorder,
+                                           shared_metrics=self.metrics)
+            redis_opentracing.trace_client(self.client)
+
+            # The failing recorders neither break nor mask the commands.
+            self.assertEqual(self.client.get('my.key'), b'1')
+            with self.assertRaises(KeyError):
+                self.client.get('my.key')
+
+        self.assertEqual(recorder.record.call_count, 2)
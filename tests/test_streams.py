@@ -0,0 +1,124 @@
+from opentracing.mocktracer import MockTracer
+import json
+import time
+import unittest
+
+import opentracing
+import redis
+import redis_opentracing
+from redis_opentracing import tracing
+from mock import patch
+
+
+def _entry_id(age_ms):
+    return '%d-0' % (int(time.time() * 1000) - age_ms)
+
+
+class TestStreams(unittest.TestCase):
+    def setUp(self):
+        self.tracer = MockTracer()
+        self.client = redis.StrictRedis()
+        redis_opentracing.init_tracing(self.tracer,
+                                       trace_all_classes=False)
+
+    def tearDown(self):
+        tracing._reset_tracing()
+
+    def test_inject_stream_context(self):
+        with self.tracer.start_active_span('producer') as scope:
+            fields = redis_opentracing.inject_stream_context({'a': '1'})
+
+        self.assertEqual(fields['a'], '1')
+        self.assertTrue('ot-span-context' in fields)
+        context = self.tracer.extract(
+            opentracing.Format.TEXT_MAP,
+            json.loads(fields['ot-span-context'])
+        )
+        self.assertEqual(context.span_id, scope.span.context.span_id)
+
+    def test_inject_stream_context_no_span(self):
+        fields = {'a': '1'}
+        self.assertEqual(redis_opentracing.inject_stream_context(fields),
+                         fields)
+
+    def test_trace_stream_batch(self):
+        with self.tracer.start_active_span('producer') as scope:
+            producer_ctx = scope.span.context
+            fields = redis_opentracing.inject_stream_context({'a': '1'})
+
+        reply = [
+            [b'events', [
+                (_entry_id(5000), fields),
+                (_entry_id(1000), {'a': '2'}),
+            ]],
+        ]
+
+        processed = []
+        with patch.object(self.tracer, 'start_active_span',
+                          wraps=self.tracer.start_active_span) as start:
+            with redis_opentracing.trace_stream_batch(reply) as batch:
+                for stream, entry_id, entry_fields in batch:
+                    processed.append(entry_fields)
+
+            references = start.call_args_list[1][1]['references']
+            self.assertEqual(len(references), 2)
+            self.assertEqual(references[1].type, 'follows_from')
+            self.assertEqual(references[1].referenced_context.span_id,
+                             producer_ctx.span_id)
+
+        self.assertEqual(processed, [{'a': '1'}, {'a': '2'}])
+
+        spans = self.tracer.finished_spans()[1:]
+        self.assertEqual([span.operation_name for span in spans],
+                         ['XENTRY', 'XENTRY', 'XBATCH'])
+        batch_span = spans[-1]
+        self.assertEqual(batch_span.tags['redis.stream.batch_size'], 2)
+        self.assertTrue(
+            batch_span.tags['redis.stream.max_entry_age_ms'] >= 5000
+        )
+        for span in spans[:2]:
+            self.assertEqual(span.parent_id, batch_span.context.span_id)
+            self.assertEqual(span.tags['redis.stream.name'], 'events')
+        self.assertTrue(spans[0].tags['redis.stream.entry_age_ms'] >= 5000)
+        self.assertTrue(spans[1].tags['redis.stream.entry_age_ms'] < 5000)
+
+    def test_trace_stream_batch_no_entry_spans(self):
+        reply = [['events', [(_entry_id(0), {'a': '1'})]]]
+        with redis_opentracing.trace_stream_batch(reply,
+                                                  entry_spans=False) as batch:
+            self.assertEqual(len(list(batch)), 1)
+
+        spans = self.tracer.finished_spans()
+        self.assertEqual(len(spans), 1)
+        self.assertEqual(spans[0].operation_name, 'XBATCH')
+
+    def test_trace_stream_batch_pending(self):
+        reply = [['events', [(_entry_id(0), {'a': '1'})]]]
+        with patch.object(self.client, 'xpending',
+                          return_value={'pending': 7}) as xpending:
+            with redis_opentracing.trace_stream_batch(reply,
+                                                      client=self.client,
+                                                      groupname='group'):
+                pass
+
+            xpending.assert_called_once_with('events', 'group')
+
+        span = self.tracer.finished_spans()[0]
+        self.assertEqual(span.tags['redis.stream.pending'], 7)
+
+    def test_trace_stream_batch_error(self):
+        reply = [['events', [
+            (_entry_id(0), {'a': '1'}),
+            (_entry_id(0), {'a': '2'}),
+        ]]]
+        with self.assertRaises(ValueError):
+            with redis_opentracing.trace_stream_batch(reply) as batch:
+                for _ in batch:
+                    raise ValueError()
+
+        spans = self.tracer.finished_spans()
+        self.assertEqual([span.operation_name for span in spans],
+                         ['XENTRY', 'XBATCH'])
+        for span in spans:
+            self.assertTrue(span.tags['error'])
+        self.assertIsNone(self.tracer.active_span)
@@ -3,6 +3,7 @@ from mock import patch
 import unittest
 
 import redis
+import redis.cluster
 import redis_opentracing
 from redis_opentracing import tracing
 
@@ -16,10 +17,24 @@ class TestTracing(unittest.TestCase):
         # after-test restoration.
         self._execute_command = redis.StrictRedis.execute_command
         self._pipeline = redis.StrictRedis.pipeline
+        self._methods = {
+            klass: dict(vars(klass)) for klass in (
+                redis.StrictRedis,
+                redis.cluster.RedisCluster,
+                redis.ConnectionPool,
+                redis.BlockingConnectionPool,
+            )
+        }
 
     def tearDown(self):
         redis.StrictRedis.execute_command = self._execute_command
         redis.StrictRedis.pipeline = self._pipeline
+        for klass, methods in self._methods.items():
+            for name, method in methods.items():
+                if vars(klass).get(name) is not method:
+                    setattr(klass, name, method)
+            for name in set(vars(klass)) - set(methods):
+                delattr(klass, name)
         tracing._reset_tracing()
 
     def test_trace_nothing(self):
@@ -102,3 +117,18 @@ class TestTracing(unittest.TestCase):
             'db.statement': 'SUBSCRIBE test',
             'span.kind': 'client',
         })
+
+    def test_trace_all_pool(self):
+        redis_opentracing.init_tracing(self.tracer)
+        pool = redis.ConnectionPool()
+
+        with patch.object(pool, 'connection_class'):
+            conn = pool.get_connection()
+            stats = redis_opentracing.get_pool_stats(pool)
+            self.assertEqual(stats['in_use'], 1)
+            self.assertEqual(stats['idle'], 0)
+
+            pool.release(conn)
+            stats = redis_opentracing.get_pool_stats(pool)
+            self.assertEqual(stats['in_use'], 0)
+            self.assertEqual(stats['idle'], 1)
@@ -0,0 +1,124 @@
+from opentracing.mocktracer import MockTracer
+from mock import patch
+import unittest
+
+import redis
+import redis_opentracing
+from redis_opentracing import tracing
+
+
+class TestTransaction(unittest.TestCase):
+    def setUp(self):
+        self.tracer = MockTracer()
+        self.client = redis.StrictRedis()
+
+    def tearDown(self):
+        tracing._reset_tracing()
+
+    def _patch_pipeline(self, execute_side_effect):
+        klass = redis.client.Pipeline
+        return (
+            patch.object(klass, 'execute', side_effect=execute_side_effect),
+            patch.object(klass, 'immediate_execute_command',
+                         return_value=True),
+        )
+
+    def test_trace_transaction(self):
+        execute_patch, immediate_patch = self._patch_pipeline([['OK']])
+        with execute_patch as execute, immediate_patch as iexecute:
+            execute.__name__ = 'execute'
+            iexecute.__name__ = 'immediate_execute_command'
+
+            redis_opentracing.init_tracing(self.tracer,
+                                           trace_all_classes=False)
+            redis_opentracing.trace_client(self.client)
+            res = self.client.transaction(
+                lambda pipe: pipe.set('user:1:name', 'foo'),
+                'user:1:name',
+            )
+
+            self.assertEqual(res, ['OK'])
+            self.assertEqual(execute.call_count, 1)
+
+        spans = self.tracer.finished_spans()
+        self.assertEqual([span.operation_name for span in spans],
+                         ['WATCH', 'MULTI', 'TRANSACTION'])
+        parent = spans[-1]
+        for span in spans[:-1]:
+            self.assertEqual(span.parent_id, parent.context.span_id)
+
+        self.assertEqual(parent.tags, {
+            'component': 'redis-py',
+            'db.type': 'redis',
+            'db.statement': 'WATCH user:1:name',
+            'span.kind': 'client',
+            'redis.transaction.attempts': 1,
+            'redis.transaction.retries': 0,
+        })
+        self.assertEqual(len(parent.logs), 1)
+        self.assertEqual(parent.logs[0].key_values['outcome'], 'ok')
+        self.assertEqual(redis_opentracing.get_contention_stats(), {})
+
+    def test_trace_transaction_contention(self):
+        execute_patch, immediate_patch = self._patch_pipeline([
+            redis.WatchError(),
+            redis.WatchError(),
+            ['OK'],
+        ])
+        with execute_patch as execute, immediate_patch as iexecute:
+            execute.__name__ = 'execute'
+            iexecute.__name__ = 'immediate_execute_command'
+
+            redis_opentracing.init_tracing(self.tracer,
+                                           trace_all_classes=False)
+            redis_opentracing.trace_client(self.client)
+            res = self.client.transaction(
+                lambda pipe: pipe.set('user:1:name', 'foo'),
+                'user:1:name',
+                value_from_callable=True,
+            )
+
+            self.assertEqual(execute.call_count, 3)
+
+        spans = self.tracer.finished_spans()
+        multi_spans = [span for span in spans
+                       if span.operation_name == 'MULTI']
+        self.assertEqual(len(multi_spans), 3)
+        for span in multi_spans[:2]:
+            self.assertTrue(span.tags['redis.contention'])
+            self.assertFalse('error' in span.tags)
+
+        parent = spans[-1]
+        self.assertEqual(parent.operation_name, 'TRANSACTION')
+        self.assertEqual(parent.tags['redis.transaction.attempts'], 3)
+        self.assertEqual(parent.tags['redis.transaction.retries'], 2)
+        self.assertTrue(parent.tags['redis.contention'])
+        self.assertFalse('error' in parent.tags)
+        self.assertEqual([log.key_values['outcome'] for log in parent.logs],
+                         ['contention', 'contention', 'ok'])
+        self.assertEqual(redis_opentracing.get_contention_stats(), {
+            'user:{id}:name': 2,
+        })
+
+    def test_trace_transaction_error(self):
+        execute_patch, immediate_patch = self._patch_pipeline(ValueError)
+        with execute_patch as execute, immediate_patch as iexecute:
+            execute.__name__ = 'execute'
+            iexecute.__name__ = 'immediate_execute_command'
+
+            redis_opentracing.init_tracing(self.tracer,
+                                           trace_all_classes=False)
+            redis_opentracing.trace_client(self.client)
+
+            with self.assertRaises(ValueError):
+                self.client.transaction(
+                    lambda pipe: pipe.set('foo', 'bar'),
+                    'foo',
+                )
+
+        parent = self.tracer.finished_spans()[-1]
+        self.assertEqual(parent.operation_name, 'TRANSACTION')
+        self.assertTrue(parent.tags['error'])
+        self.assertEqual(parent.tags['redis.transaction.attempts'], 1)
+        self.assertEqual(parent.logs[0].key_values['outcome'], 'error')
+        self.assertEqual(parent.logs[1].key_values['event'], 'error')
@@ -0,0 +1,202 @@
+from opentracing.mocktracer import MockTracer
+from mock import patch
+import threading
+import time
+import unittest
+
+import redis
+import redis_opentracing
+from redis_opentracing import tracing
+
+
+class TestSpanWorker(unittest.TestCase):
+    def setUp(self):
+        self.worker = redis_opentracing.SpanWorker(queue_size=1)
+
+    def tearDown(self):
+        self.worker.close()
+
+    def test_submit(self):
+        results = []
+        self.worker.submit(results.append, 1)
+        self.worker.flush()
+        self.assertEqual(results, [1])
+
+    def test_submit_exc(self):
+        results = []
+        self.worker.submit(int, 'not an int')
+        self.worker.flush()
+        self.worker.submit(results.append, 1)
+        self.worker.flush()
+        self.assertEqual(results, [1])
+
+    def test_dropped(self):
+        started = threading.Event()
+        release = threading.Event()
+
+        def block():
+            started.set()
+            release.wait()
+
+        results = []
+        self.worker.submit(block)
+        started.wait()
+        self.worker.submit(results.append, 1)
+        self.worker.submit(results.append, 2)
+        self.worker.submit(results.append, 3)
+        self.assertEqual(self.worker.dropped, 2)
+
+        release.set()
+        self.worker.flush()
+        self.assertEqual(results, [1])
+
+    def test_close(self):
+        self.worker.submit(lambda: None)
+        thread = self.worker._thread
+        self.worker.close()
+        self.assertFalse(thread.is_alive())
+
+
+class DummyConnection(object):
+    def __init__(self, **kwargs):
+        self.pid = None
+
+    def connect(self):
+        pass
+
+    def can_read(self):
+        return False
+
+    def disconnect(self):
+        pass
+
+
+class TestDeferredSpans(unittest.TestCase):
+    def setUp(self):
+        self.tracer = MockTracer()
+        self.client = redis.StrictRedis()
+        self.worker = redis_opentracing.SpanWorker()
+
+    def tearDown(self):
+        self.worker.close()
+        tracing._reset_tracing()
+
+    def _slow_command(self, *args, **kwargs):
+        time.sleep(0.01)
+        return '1'
+
+    def test_trace_client(self):
+        with patch.object(self.client, 'execute_command',
+                          side_effect=self._slow_command) as exc_command:
+            exc_command.__name__ = 'execute_command'
+
+            redis_opentracing.init_tracing(self.tracer,
+                                           trace_all_classes=False,
+                                           span_worker=self.worker)
+            redis_opentracing.trace_client(self.client)
+            with self.tracer.start_active_span('request') as scope:
+                start_time = time.time()
+                self.assertEqual(self.client.get('my.key'), '1')
+                finish_time = time.time()
+                parent = scope.span
+
+        self.worker.flush()
+        spans = self.tracer.finished_spans()
+        self.assertEqual(len(spans), 2)
+        span = [s for s in spans if s.operation_name == 'GET'][0]
+        self.assertEqual(span.parent_id, parent.context.span_id)
+        self.assertEqual(span.tags['db.statement'], 'GET my.key')
+        self.assertTrue(start_time <= span.start_time)
+        self.assertTrue(span.finish_time <= finish_time)
+        self.assertTrue(span.finish_time - span.start_time >= 0.01)
+
+    def test_trace_client_error(self):
+        commands = []
+
+        with patch.object(self.client, 'execute_command',
+                          side_effect=ValueError) as exc_command:
+            exc_command.__name__ = 'execute_command'
+
+            redis_opentracing.init_tracing(
+                self.tracer,
+                trace_all_classes=False,
+                finish_span_cb=lambda span, command: commands.append(command),
+                span_worker=self.worker,
+            )
+            redis_opentracing.trace_client(self.client)
+            with self.assertRaises(ValueError):
+                self.client.get('my.key')
+
+        self.worker.flush()
+        span = self.tracer.finished_spans()[0]
+        self.assertEqual(span.tags['error'], True)
+        self.assertEqual(span.logs[0].timestamp, span.finish_time)
+        self.assertTrue(isinstance(commands[0].exception, ValueError))
+
+    def test_trace_pipeline(self):
+        pipe = self.client.pipeline()
+        with patch.object(pipe, 'execute',
+                          return_value=[1]) as execute:
+            execute.__name__ = 'execute'
+
+            redis_opentracing.init_tracing(self.tracer,
+                                           trace_all_classes=False,
+                                           span_worker=self.worker)
+            redis_opentracing.trace_pipeline(pipe)
+            pipe.lpush('my:keys', 1, 3)
+            pipe.lpush('my:keys', 5, 7)
+            self.assertEqual(pipe.execute(), [1])
+
+        self.worker.flush()
+        span = self.tracer.finished_spans()[0]
+        self.assertEqual(span.operation_name, 'MULTI')
+        self.assertEqual(span.tags['db.statement'],
+                         'LPUSH my:keys 1 3;LPUSH my:keys 5 7')
+
+    def test_trace_pool(self):
+        pool = redis.BlockingConnectionPool(
+            connection_class=DummyConnection,
+            max_connections=2,
+        )
+
+        def execute_command(*args, **kwargs):
+            pool.release(pool.get_connection())
+            return '1'
+
+        with patch.object(self.client, 'execute_command',
+                          side_effect=execute_command) as exc_command:
+            exc_command.__name__ = 'execute_command'
+
+            redis_opentracing.init_tracing(self.tracer,
+                                           trace_all_classes=False,
+                                           span_worker=self.worker)
+            redis_opentracing.trace_client(self.client)
+            redis_opentracing.trace_connection_pool(pool)
+            with self.tracer.start_active_span('request'):
+                self.client.get('my.key')
+
+        self.worker.flush()
+        spans = dict((span.operation_name, span)
+                     for span in self.tracer.finished_spans())
+        self.assertTrue(spans['GET'].tags['redis.pool.wait_time_ms'] >= 0)
+        self.assertFalse('redis.pool.wait_time_ms' in spans['request'].tags)
+
+    def test_overhead(self):
+        with patch.object(self.client, 'execute_command',
+                          side_effect=self._slow_command) as exc_command:
+            exc_command.__name__ = 'execute_command'
+
+            redis_opentracing.init_tracing(self.tracer,
+                                           trace_all_classes=False,
+                                           overhead_tag=True,
+                                           span_worker=self.worker)
+            redis_opentracing.trace_client(self.client)
+            self.client.get('my.key')
+
+        self.worker.flush()
+        stats = redis_opentracing.get_overhead_stats()
+        self.assertEqual(stats['count'], 1)
+        self.assertTrue(0 < stats['total'] < 0.01)
+
+        span = self.tracer.finished_spans()[0]
+        self.assertTrue('redis.tracing.overhead_ms' in span.tags)